@@ -0,0 +1,12 @@
+"""
+Benchmarks for pietc.
+
+`bench.suite` measures the corpus in `bench/corpus` and the programs of
+`bench.generators` and compares them against `bench/baseline.json`:
+
+    $ python -m bench                 # compare against the baseline
+    $ python -m bench --update        # store a new baseline
+
+`bench/roll.py` and `bench/memory.py` are standalone micro-benchmarks.
+
+"""
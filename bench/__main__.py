@@ -0,0 +1,53 @@
+import sys
+import argparse
+from bench import suite
+
+def main (argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m bench',
+        description='Benchmark pietc against a stored baseline.')
+    parser.add_argument('programs', nargs='*',
+                        help='only measure these programs')
+    parser.add_argument('--update', action='store_true',
+                        help='store the results as the new baseline')
+    parser.add_argument('--baseline', default=suite.BASELINE)
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='measurements per program (fastest is kept)')
+    parser.add_argument('--scale', type=float, default=1,
+                        help='scale the sizes of the generated programs')
+    parser.add_argument('--tolerance', type=float, default=0.05,
+                        help='allowed relative growth of counts')
+    parser.add_argument('--time-tolerance', type=float, default=0.5,
+                        help='allowed relative growth of times')
+    parser.add_argument('--check-times', metavar='PATH',
+                        help='also compare times against this file, which '
+                        'holds times measured on this machine (written by '
+                        '--update); times are not checked otherwise')
+    args = parser.parse_args(argv)
+    results = suite.run(args.scale, args.repeat, args.programs)
+    if args.update:
+        suite.save_baseline(results, args.baseline)
+        print(suite.report(results))
+        print('baseline written to {}'.format(args.baseline))
+        if args.check_times:
+            suite.save_baseline(results, args.check_times, suite.TIMES)
+            print('times written to {}'.format(args.check_times))
+        return 0
+    try:
+        baseline = suite.load_baseline(args.baseline)
+    except FileNotFoundError:
+        baseline = {}
+    if args.check_times:
+        for name, times in suite.load_baseline(args.check_times).items():
+            baseline.setdefault(name, {}).update(times)
+    print(suite.report(results, baseline))
+    regressions = suite.compare(results, baseline, args.tolerance,
+                                args.time_tolerance)
+    for name, metric, base, res in regressions:
+        print('regression: {} {}: {} -> {}'.format(
+            name, metric, suite.format_value(metric, base),
+            suite.format_value(metric, res)))
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
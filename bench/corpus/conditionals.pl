@@ -0,0 +1,16 @@
+;; Deeply nested conditionals, with tests that are only known at runtime.
+(define identity (lambda (x) x))
+(if (> (identity 5) 3)
+    (if (< (identity 2) 1)
+        1
+        (if (eq (identity 4) 4)
+            (if (> (identity 9) (identity 8))
+                (if (not (identity 0))
+                    (if (>= (identity 3) 3)
+                        (if (<= (identity 7) 6) 7 8)
+                        6)
+                    5)
+                4)
+            3))
+    2)
+(if #t (if #f 1 (if #t (if #t (if #f 2 3)))))
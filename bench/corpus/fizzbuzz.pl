@@ -0,0 +1,11 @@
+;; FizzBuzz without output: every number is classified as 0 (plain),
+;; 1 (fizz), 2 (buzz) or 3 (fizzbuzz) and the classes are summed.
+(define identity (lambda (x) x))
+(define divides (lambda (d i) (not (modulo i d))))
+(define classify (lambda (i) (+ (divides 3 i) (* 2 (divides 5 i)))))
+(define fizzbuzz
+  (lambda (i n acc)
+    (if (> i n)
+        acc
+        (fizzbuzz (+ i 1) n (+ acc (classify i))))))
+(fizzbuzz (identity 1) (identity 100) 0)
@@ -0,0 +1,15 @@
+;; Higher-order lambdas that expand into many nested LambdaSequences, and
+;; tail-recursive loops.
+(define identity (lambda (x) x))
+(define twice (lambda (x) (* 2 x)))
+(define repeat (lambda (f) (lambda (y) (f (f y)))))
+(define verbose (lambda (f) (lambda (y) (f y))))
+(define compose (lambda (f g) (lambda (x) (f (g x)))))
+(define fact (lambda (n acc) (if (< n 2) acc (fact (- n 1) (* acc n)))))
+(define triangle (lambda (n acc) (if (> n 0) (triangle (- n 1) (+ acc n)) acc)))
+((repeat (repeat twice)) (identity 5))
+(((repeat repeat) twice) (identity 3))
+((verbose (verbose (verbose identity))) (identity 7))
+((compose twice (repeat twice)) (identity 1))
+(fact (identity 10) 1)
+(triangle (identity 200) 0)
@@ -0,0 +1,6 @@
+;; Long string literals, which are lexed into quoted lists of characters.
+(define lorem "Lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut labore et dolore magna aliqua. Ut enim ad minim veniam quis nostrud exercitation ullamco laboris nisi ut aliquip ex ea commodo consequat.")
+(define duis "Duis aute irure dolor in reprehenderit in voluptate velit esse cillum dolore eu fugiat nulla pariatur. Excepteur sint occaecat cupidatat non proident sunt in culpa qui officia deserunt mollit anim id est laborum.")
+(define identity (lambda (x) x))
+(identity "The quick brown fox jumps over the lazy dog again and again and again.")
+(+ (identity 1) 2)
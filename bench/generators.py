@@ -0,0 +1,65 @@
+"""
+Parametric programs that scale the corpus up.
+
+Every generator takes a size and returns the source of a program as a list
+of lines, in the same form as a file read by `pietc.parse.iter_sexpressions`.
+
+"""
+import string
+
+PRELUDE = [
+    '(define identity (lambda (x) x))\n',
+    '(define twice (lambda (x) (* 2 x)))\n',
+]
+
+def fizzbuzz (size):
+    """Classify and sum the numbers up to `size` in a single loop."""
+    return PRELUDE + [
+        '(define divides (lambda (d i) (not (modulo i d))))\n',
+        '(define classify (lambda (i) (+ (divides 3 i) (* 2 (divides 5 i)))))\n',
+        '(define fizzbuzz (lambda (i n acc) (if (> i n) acc '
+        '(fizzbuzz (+ i 1) n (+ acc (classify i))))))\n',
+        '(fizzbuzz (identity 1) (identity {}) 0)\n'.format(size),
+    ]
+
+def lambdas (size):
+    """A chain of `size` lambdas that each call the previous one."""
+    lines = PRELUDE + ['(define f0 (lambda (x) (twice x)))\n']
+    for i in range(1, size + 1):
+        lines.append('(define f{} (lambda (x) (f{} (+ x {}))))\n'
+                     .format(i, i - 1, i % 7 + 1))
+    lines.append('(f{} (identity 1))\n'.format(size))
+    return lines
+
+def strings (size):
+    """`size` definitions of string literals of 80 characters."""
+    alphabet = string.ascii_letters + string.digits + ' '
+    lines = list(PRELUDE)
+    for i in range(size):
+        text = ''.join(alphabet[(i + j) % len(alphabet)] for j in range(80))
+        lines.append('(define s{} "{}")\n'.format(i, text))
+    lines.append('(identity "{}")\n'.format(alphabet))
+    lines.append('(+ (identity 1) 2)\n')
+    return lines
+
+def conditionals (size):
+    """Conditionals nested `size` deep whose tests are known at runtime."""
+    sexpr = '0'
+    for i in range(size):
+        sexpr = '(if (> (identity {}) {}) {} {})'.format(
+            i % 3, 1, i + 1, sexpr)
+    return PRELUDE + [sexpr + '\n']
+
+# the generated programs of the suite, by name.
+GENERATORS = {
+    'fizzbuzz' : (fizzbuzz, 1000),
+    'lambdas' : (lambdas, 60),
+    'strings' : (strings, 400),
+    'conditionals' : (conditionals, 60),
+}
+
+def generate (scale=1):
+    """Yield `(name, lines)` for every generated program."""
+    for name, (generator, size) in GENERATORS.items():
+        size = max(1, int(size * scale))
+        yield '{}-{}'.format(name, size), generator(size)
@@ -0,0 +1,75 @@
+"""
+Memory benchmark for compiling a large generated program.
+
+Each measurement compiles the program in a fresh interpreter and reports the
+peak RSS along with the number of emitted commands. `legacy` replaces
+`Command` and `Push` with the previous implementation (an ndarray `shift` and
+a `__dict__` per instance) so that both can be compared on the same tree.
+
+    $ python bench/memory.py [forms]
+
+"""
+import sys
+import resource
+import subprocess
+import numpy as np
+
+DEFINITIONS = '(define identity (lambda (x) x))\n'
+
+def generate (forms):
+    """Return a program that emits roughly `6 * forms` commands."""
+    lines = [DEFINITIONS]
+    for i in range(forms):
+        lines.append('(+ (identity {}) (identity {}))\n'.format(i, i + 1))
+    return lines
+
+class LegacyCommand (object):
+    def __init__ (self, name):
+        from pietc.piet import COMMAND_DIFFERENTIALS
+        self.name = name
+        self.has_args = False
+        self.shift = np.asarray(COMMAND_DIFFERENTIALS[self.name])
+
+class LegacyPush (LegacyCommand):
+    def __init__ (self, value):
+        super().__init__(name='push')
+        self.value = value
+
+def count (seq, visited):
+    from pietc.eval import Sequence, Conditional
+    from pietc.piet import Command
+    res = 0
+    for stmt in seq:
+        if isinstance(stmt, (Command, LegacyCommand)):
+            res += 1
+        elif isinstance(stmt, Sequence) and not isinstance(stmt, Conditional) \
+             and id(stmt) not in visited:
+            visited.add(id(stmt))
+            res += count(stmt, visited)
+    return res
+
+def measure (forms, legacy):
+    import pietc.piet
+    from pietc import compile_source
+    if legacy:
+        pietc.piet.Command = LegacyCommand
+        pietc.piet.Push = LegacyPush
+    program = compile_source(generate(forms))
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(count(program, set()), peak)
+
+def run (forms, legacy):
+    out = subprocess.run([sys.executable, __file__, '--measure', str(forms),
+                          str(int(legacy))],
+                         check=True, capture_output=True, text=True).stdout
+    return tuple(map(int, out.split()))
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--measure']:
+        measure(int(sys.argv[2]), bool(int(sys.argv[3])))
+        sys.exit()
+    forms = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    for label, legacy in (('legacy', True), ('slotted', False)):
+        commands, peak = run(forms, legacy)
+        print('{:<8} {:>8} commands  peak RSS {:>8.1f} MiB'
+              .format(label, commands, peak / 1024))
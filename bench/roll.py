@@ -0,0 +1,31 @@
+"""
+Micro-benchmark for `pietc.sim.roll_stack`.
+
+Times a roll of a fixed depth on stacks of increasing height, then rolls of
+increasing depth on a stack of fixed height. The first table should stay flat
+and the second should grow with the depth.
+
+    $ python bench/roll.py
+
+"""
+import timeit
+from pietc.sim import roll_stack
+
+NUMBER = 20000
+
+def time_roll (height, depth):
+    stack = list(range(height))
+    timer = timeit.Timer(lambda: roll_stack(stack, depth, 1))
+    return min(timer.repeat(repeat=5, number=NUMBER)) / NUMBER
+
+def report (label, rows):
+    print(label)
+    for height, depth in rows:
+        print('  height={:<8} depth={:<6} {:8.3f} us'
+              .format(height, depth, 1e6 * time_roll(height, depth)))
+
+if __name__ == '__main__':
+    report('fixed depth, growing stack:',
+           [(height, 2) for height in (10, 100, 1000, 10000, 100000)])
+    report('fixed stack, growing depth:',
+           [(100000, depth) for depth in (2, 10, 100, 1000, 10000)])
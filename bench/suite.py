@@ -0,0 +1,157 @@
+"""
+Measure compile, render and simulation costs of the benchmark programs.
+
+Every program is measured `repeat` times from its source and the fastest
+time of each phase is kept:
+
+parse
+    seconds to lex and parse every top-level form.
+evaluate
+    seconds to evaluate the forms into a Program.
+simulate
+    seconds to simulate the Program.
+commands
+    instructions in its Bytecode once simulated, not counting calls, jumps
+    and returns (so including the branches that were taken).
+area
+    codels in its image, as laid out by `pietc.layout.Layout`.
+steps
+    commands executed by the simulator.
+
+"""
+import os
+import json
+import time
+from pietc import Program
+from pietc.eval import evaluate
+from pietc.parse import get_parser, iter_sexpressions
+from pietc.sim import Simulator
+from pietc.layout import Layout
+from pietc.ir import CALL, BRANCH, RETURN, JUMP, JUMPZ
+from bench.generators import generate
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CORPUS = os.path.join(HERE, 'corpus')
+BASELINE = os.path.join(HERE, 'baseline.json')
+
+TIMES = ('parse', 'evaluate', 'simulate')
+COUNTS = ('commands', 'area', 'steps')
+METRICS = TIMES + COUNTS
+CONTROL = (CALL, BRANCH, RETURN, JUMP, JUMPZ)
+
+def corpus ():
+    """Yield `(name, lines)` for every program in the corpus."""
+    for name in sorted(os.listdir(CORPUS)):
+        if name.endswith('.pl'):
+            with open(os.path.join(CORPUS, name)) as File:
+                yield os.path.splitext(name)[0], File.readlines()
+
+def programs (scale=1):
+    yield from corpus()
+    yield from generate(scale)
+
+def measure_once (lines):
+    res = {}
+    start = time.perf_counter()
+    forms = list(iter_sexpressions(lines))
+    res['parse'] = time.perf_counter() - start
+    start = time.perf_counter()
+    program = Program()
+    for sexpr in forms:
+        evaluate(sexpr, program.env, program)
+    res['evaluate'] = time.perf_counter() - start
+    start = time.perf_counter()
+    sim = Simulator(program)
+    sim.run()
+    res['simulate'] = time.perf_counter() - start
+    res['commands'] = sum(1 for op in sim.ir.ops if op not in CONTROL)
+    res['area'] = Layout(sim.ir).area
+    res['steps'] = sim.steps
+    return res
+
+def measure (lines, repeat=3):
+    """Return the metrics of a program, with the fastest of its times."""
+    best = measure_once(lines)
+    for _ in range(repeat - 1):
+        res = measure_once(lines)
+        for name in TIMES:
+            best[name] = min(best[name], res[name])
+    return best
+
+def run (scale=1, repeat=3, select=None):
+    """Return the metrics of every program (or those named in `select`)."""
+    # build the parser tables before anything is timed.
+    get_parser()
+    return dict((name, measure(lines, repeat))
+                for name, lines in programs(scale)
+                if not select or name in select)
+
+def load_baseline (path=BASELINE):
+    with open(path) as File:
+        return json.load(File)
+
+def save_baseline (results, path=BASELINE, metrics=COUNTS):
+    """
+    Store the `metrics` of the results. Only counts are stored by default,
+    since times depend on the machine and would not gate anything else.
+    """
+    results = dict((name, dict((metric, res[metric]) for metric in metrics))
+                   for name, res in results.items())
+    with open(path, 'w') as File:
+        json.dump(results, File, indent=2, sort_keys=True)
+        File.write('\n')
+
+# times below this are too short to compare.
+TIME_RESOLUTION = 1e-3
+
+def compare (results, baseline, tolerance=0.05, time_tolerance=0.5):
+    """
+    Compare results against a baseline and return the regressions as
+    `(program, metric, baseline, result)` tuples.
+
+    Only the metrics in the baseline are compared. A count regresses once
+    it grows by more than `tolerance` and a time once it grows by more than
+    `time_tolerance` (both relative). The stored baseline only holds counts,
+    so times are only compared against one measured on the same machine.
+
+    """
+    regressions = []
+    for name, res in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for metric in METRICS:
+            if metric not in base:
+                continue
+            if metric in TIMES:
+                limit = max(base[metric], TIME_RESOLUTION) \
+                    * (1 + time_tolerance)
+            else:
+                limit = base[metric] * (1 + tolerance)
+            if res[metric] > limit:
+                regressions.append((name, metric, base[metric], res[metric]))
+    return regressions
+
+def format_value (metric, value):
+    if value is None:
+        return '-'
+    if metric in TIMES:
+        return '{:.2f}ms'.format(1e3 * value)
+    return str(value)
+
+def report (results, baseline=None):
+    """Return a table of the results, with changes against the baseline."""
+    baseline = baseline or {}
+    width = max([len('program')] + [len(name) for name in results])
+    lines = ['{:<{}} '.format('program', width)
+             + ' '.join('{:>18}'.format(metric) for metric in METRICS)]
+    for name, res in results.items():
+        cells = []
+        for metric in METRICS:
+            cell = format_value(metric, res[metric])
+            base = baseline.get(name, {}).get(metric)
+            if base:
+                cell += ' {:+4.0f}%'.format(100 * (res[metric] / base - 1))
+            cells.append('{:>18}'.format(cell))
+        lines.append('{:<{}} '.format(name, width) + ' '.join(cells))
+    return '\n'.join(lines)
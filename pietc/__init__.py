@@ -20,8 +20,40 @@ DEFAULT_ENV = Environment({
 })
 
 class Program (Sequence):
+    """
+    The top-level Sequence of a source file.
+
+    Each program evaluates in its own copy of DEFAULT_ENV, so definitions
+    made by one program are never visible to another.
+
+    """
     def __init__ (self):
-        super().__init__([], DEFAULT_ENV)
+        super().__init__([], Environment(DEFAULT_ENV))
 
     def __repr__ (self):
         return '{}({})'.format(self.__class__.__name__, list(self))
+
+def compile_source (source, program=None):
+    """
+    Evaluate every top-level form of `source` into a Program and return it.
+
+    Parameters
+    ==========
+
+    source : str, iterable of str
+        The path of a source file, or any file-like object (or iterable)
+        producing lines of source.
+    program : Program
+        The Program to evaluate into. Defaults to a new one.
+
+    """
+    from pietc.eval import evaluate
+    from pietc.parse import iter_sexpressions
+    if program is None:
+        program = Program()
+    if isinstance(source, str):
+        with open(source) as File:
+            return compile_source(File, program)
+    for sexpr in iter_sexpressions(source):
+        evaluate(sexpr, program.env, program)
+    return program
@@ -0,0 +1,4 @@
+import sys
+from pietc.cli import main
+
+sys.exit(main())
@@ -0,0 +1,239 @@
+import os
+import pickle
+import hashlib
+import tempfile
+
+# bump whenever the commands generated for a form may change.
+CACHE_VERSION = 5
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+STREAM = '.stream'
+IMAGE = '.png'
+# holds the running size of the entries, see `CompileCache.grow`.
+USAGE = 'usage'
+
+def digest (*parts):
+    """Return the hex sha256 of the repr of `parts`."""
+    return hashlib.sha256(repr((CACHE_VERSION,) + parts).encode()).hexdigest()
+
+def symbols (sexpr, res=None):
+    """Return the set of every symbol that appears in an s-expression."""
+    if res is None:
+        res = set()
+    if isinstance(sexpr, list):
+        for item in sexpr:
+            symbols(item, res)
+    elif isinstance(sexpr, str):
+        res.add(sexpr)
+    return res
+
+def is_definition (sexpr):
+    return isinstance(sexpr, list) and len(sexpr) == 3 \
+        and sexpr[0] == 'define' and isinstance(sexpr[1], str)
+
+def form_keys (forms, *options):
+    """
+    Return the cache key of every top-level form.
+
+    The key of a form covers its own text along with the text of every
+    definition it references, directly or through other definitions.
+    Lambdas resolve globals when they are called rather than when they are
+    defined, so references are followed through the definitions in force
+    where the form is, which includes definitions that come after the ones
+    that reference them and the latest of any rebinding. Editing a `define`
+    thus invalidates every form that may depend on it and nothing else.
+    `options` are mixed into every key.
+
+    """
+    bound = {}
+    keys = []
+    for sexpr in forms:
+        deps = []
+        seen = set()
+        pending = list(symbols(sexpr))
+        while pending:
+            name = pending.pop()
+            if name in seen or name not in bound:
+                continue
+            seen.add(name)
+            deps.append((name, bound[name]))
+            pending.extend(symbols(bound[name]))
+        keys.append(digest(options, sexpr, sorted(deps)))
+        if is_definition(sexpr):
+            bound[sexpr[1]] = sexpr[2]
+    return keys
+
+class CompileCache (object):
+    """
+    A content-addressed store of compiled command streams and images.
+
+    Entries are files named after their key below `directory`. Reading an
+    entry touches it, so the modification times order the entries from least
+    to most recently used, and `evict` removes the oldest ones once the cache
+    grows past `max_bytes`. Entries are written to a temporary file and
+    renamed into place, so several processes can share a cache.
+
+    The size of the entries is kept in a USAGE file that every write adds
+    to, so the cache is only walked once it may have grown too large. With
+    several writers the count may drift, and `evict` resets it to the size
+    it finds.
+
+    Examples
+    ========
+
+    >>> from pietc.cache import CompileCache
+    >>> cache = CompileCache('/tmp/pietc-cache')
+    >>> cache.put(key, STREAM, data)
+    >>> cache.get(key, STREAM) == data
+    True
+
+    """
+    def __init__ (self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def path (self, key, kind):
+        return os.path.join(self.directory, key[:2], key + kind)
+
+    def get (self, key, kind):
+        """Return the bytes stored under `key` or `None`."""
+        path = self.path(key, kind)
+        try:
+            with open(path, 'rb') as File:
+                data = File.read()
+            os.utime(path)
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def put (self, key, kind, data):
+        self.write(self.path(key, kind), data)
+        self.grow(len(data))
+
+    def write (self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as File:
+            File.write(data)
+        os.replace(tmp, path)
+
+    def usage (self):
+        """Return the size of the entries as last recorded, or `None`."""
+        try:
+            with open(os.path.join(self.directory, USAGE)) as File:
+                return int(File.read())
+        except (OSError, ValueError):
+            return None
+
+    def grow (self, size):
+        """Record `size` more bytes and evict once past `max_bytes`."""
+        usage = self.usage()
+        if usage is None:
+            usage = sum(size for _, size, _ in self.entries())
+        else:
+            usage += size
+        if usage > self.max_bytes:
+            self.evict()
+        else:
+            self.write(os.path.join(self.directory, USAGE),
+                       str(usage).encode())
+
+    def get_stream (self, key):
+        data = self.get(key, STREAM)
+        return None if data is None else pickle.loads(data)
+
+    def put_stream (self, key, commands):
+        self.put(key, STREAM, pickle.dumps(commands, pickle.HIGHEST_PROTOCOL))
+
+    def entries (self):
+        """Return `(mtime, size, path)` for every entry in the cache."""
+        res = []
+        for root, dirs, files in os.walk(self.directory):
+            for name in files:
+                if root == self.directory:
+                    # only the USAGE file and temporary files live here.
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                res.append((stat.st_mtime, stat.st_size, path))
+        return res
+
+    def evict (self):
+        """Remove the least recently used entries beyond `max_bytes`."""
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                # another process got there first.
+                pass
+            total -= size
+            removed += 1
+        self.write(os.path.join(self.directory, USAGE), str(total).encode())
+        return removed
+
+    def __repr__ (self):
+        return '{}({!r}, hits={}, misses={})'.format(
+            self.__class__.__name__, self.directory, self.hits, self.misses)
+
+def compile_cached (source, output, cache, codel_size=1, band_height=None,
+                    optimize=True):
+    """
+    Compile `source` into a PNG at `output`, reusing what `cache` holds.
+
+    A whole-file hit copies the cached image without evaluating anything.
+    Otherwise every definition is evaluated (they only bind names), and any
+    other form whose key is cached contributes its stored command stream
+    instead of being evaluated and lowered again. Returns the `(height,
+    width)` of the image in pixels.
+
+    """
+    from pietc import Program
+    from pietc.eval import Sequence, evaluate
+    from pietc.parse import iter_sexpressions
+    from pietc.ir import Bytecode
+    from pietc.optimize import RULES
+    from pietc.image import flatten, draw_commands
+    with open(source) as File:
+        forms = list(iter_sexpressions(File))
+    keys = form_keys(forms, optimize)
+    image_key = digest(keys, codel_size)
+    data = cache.get(image_key, IMAGE)
+    if data is not None:
+        with open(output, 'wb') as File:
+            File.write(data)
+        return png_shape(data)
+    program = Program()
+    commands = []
+    for sexpr, key in zip(forms, keys):
+        if is_definition(sexpr):
+            evaluate(sexpr, program.env, program)
+            continue
+        stream = cache.get_stream(key)
+        if stream is None:
+            seq = Sequence([], program.env)
+            evaluate(sexpr, program.env, seq)
+            stream = flatten(Bytecode(seq, RULES if optimize else None))
+            cache.put_stream(key, stream)
+        commands.extend(stream)
+    shape = draw_commands(commands, output, codel_size, band_height)
+    with open(output, 'rb') as File:
+        cache.put(image_key, IMAGE, File.read())
+    return shape
+
+def png_shape (data):
+    """Return the `(height, width)` in the IHDR chunk of a PNG."""
+    width = int.from_bytes(data[16:20], 'big')
+    height = int.from_bytes(data[20:24], 'big')
+    return height, width
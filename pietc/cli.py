@@ -0,0 +1,228 @@
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+SOURCE_SUFFIX = '.pl'
+
+def find_sources (paths):
+    """Expand directories into the source files below them."""
+    sources = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                sources.extend(os.path.join(root, name)
+                               for name in sorted(files)
+                               if name.endswith(SOURCE_SUFFIX))
+        else:
+            sources.append(path)
+    return sources
+
+class CompileResult (object):
+    """Outcome and timings of compiling a single source file."""
+    def __init__ (self, source, output=None):
+        self.source = source
+        self.output = output
+        self.error = None
+        self.not_drawable = None
+        self.commands = 0
+        self.shape = None
+        self.times = {}
+
+    @property
+    def total (self):
+        return sum(self.times.values())
+
+    def summary (self):
+        if self.error is not None:
+            return '{}: error: {}'.format(self.source, self.error)
+        if self.not_drawable is not None:
+            return '{}: not drawable: {}'.format(self.source,
+                                                 self.not_drawable)
+        return '{}: {} commands, {}x{} codels, ' \
+            'evaluate {:.1f} ms, draw {:.1f} ms'.format(
+                self.source, self.commands, *self.shape,
+                1e3 * self.times['evaluate'], 1e3 * self.times['draw'])
+
+def compile_file (source, codel_size=1, band_height=None, optimize=True,
+                  cache_dir=None, cache_size=None):
+    """
+    Compile a source file into a PNG beside it and return a CompileResult.
+
+    This runs in a worker process, and every call builds a new Program, so
+    each source is evaluated in its own copy of the default environment.
+    With a `cache_dir`, unchanged forms and files are taken from a
+    CompileCache there instead (see `pietc.cache.compile_cached`).
+
+    """
+    from pietc import compile_source
+    from pietc.ir import Bytecode
+    from pietc.optimize import RULES
+    from pietc.image import NotDrawable, draw
+    output = os.path.splitext(source)[0] + '.png'
+    res = CompileResult(source, output)
+    try:
+        if cache_dir is not None:
+            return compile_with_cache(res, cache_dir, cache_size, codel_size,
+                                      band_height, optimize)
+        start = time.perf_counter()
+        program = Bytecode(compile_source(source),
+                           RULES if optimize else None)
+        res.times['evaluate'] = time.perf_counter() - start
+        start = time.perf_counter()
+        height, width = draw(program, output, codel_size, band_height)
+        res.times['draw'] = time.perf_counter() - start
+        res.shape = (height // codel_size, width // codel_size)
+        res.commands = res.shape[0] - 1
+    except NotDrawable as err:
+        res.not_drawable = str(err)
+    except Exception as err:
+        res.error = '{}: {}'.format(err.__class__.__name__, err)
+    return res
+
+def compile_with_cache (res, cache_dir, cache_size, codel_size, band_height,
+                        optimize):
+    from pietc.cache import CompileCache, compile_cached, DEFAULT_MAX_BYTES
+    cache = CompileCache(cache_dir, cache_size or DEFAULT_MAX_BYTES)
+    start = time.perf_counter()
+    height, width = compile_cached(res.source, res.output, cache, codel_size,
+                                   band_height, optimize)
+    # evaluation and drawing are interleaved, so all of it counts as drawing.
+    res.times['evaluate'] = 0.0
+    res.times['draw'] = time.perf_counter() - start
+    res.shape = (height // codel_size, width // codel_size)
+    res.commands = res.shape[0] - 1
+    return res
+
+def compile_command (args):
+    sources = find_sources(args.paths)
+    options = dict(codel_size=args.codel_size, band_height=args.band_height,
+                   optimize=not args.no_optimize, cache_dir=args.cache_dir,
+                   cache_size=args.cache_size and args.cache_size << 20)
+    start = time.perf_counter()
+    if args.jobs == 1:
+        results = [compile_file(source, **options) for source in sources]
+    else:
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            futures = [pool.submit(compile_file, source, **options)
+                       for source in sources]
+            results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - start
+    for res in results:
+        print(res.summary())
+    failed = sum(res.error is not None for res in results)
+    undrawable = sum(res.not_drawable is not None for res in results)
+    print('compiled {} of {} files{} in {:.2f} s ({:.2f} s of work)'.format(
+        len(results) - failed - undrawable, len(results),
+        ' ({} not drawable)'.format(undrawable) if undrawable else '',
+        elapsed, sum(res.total for res in results)))
+    return 1 if failed or undrawable else 0
+
+def stats_command (args):
+    from pietc.stats import collect, definition_stats, is_drawable, report, \
+        summary
+    documents = []
+    failed = 0
+    for source in find_sources(args.paths):
+        try:
+            ir = collect(source, optimize=not args.no_optimize,
+                         simulate=not args.no_simulate)
+            entries = definition_stats(ir)
+        except Exception as err:
+            failed += 1
+            error = '{}: {}'.format(err.__class__.__name__, err)
+            if args.json:
+                documents.append(dict(source=source, error=error))
+            else:
+                print('{}: error: {}\n'.format(source, error))
+            continue
+        if args.json:
+            documents.append(summary(source, entries, args.codel_size,
+                                     is_drawable(ir)))
+        else:
+            print(report(source, entries, args.codel_size, is_drawable(ir)))
+            print()
+    if args.json:
+        print(json.dumps(documents, indent=2))
+    return 1 if failed else 0
+
+def run_command (args):
+    from pietc.run import Interpreter
+    from pietc.translate import translate
+    stdin = sys.stdin.read() if args.input is None else args.input
+    if args.interpret:
+        output = Interpreter(args.image, stdin, args.max_steps).run()
+    else:
+        output = translate(args.image)(stdin, args.max_steps)
+    sys.stdout.write(output)
+    return 0
+
+def positive_int (text):
+    """Parse a count that must be at least 1."""
+    try:
+        value = int(text)
+    except ValueError:
+        value = 0
+    if value < 1:
+        raise argparse.ArgumentTypeError(
+            'expected a positive integer, got {!r}'.format(text))
+    return value
+
+def build_parser ():
+    parser = argparse.ArgumentParser(prog='pietc',
+                                     description='Compile lisp into Piet.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    compile_parser = commands.add_parser(
+        'compile', help='compile source files into PNGs beside them')
+    compile_parser.add_argument('paths', nargs='+',
+                                help='source files or directories')
+    compile_parser.add_argument('-j', '--jobs', type=positive_int,
+                                default=os.cpu_count(),
+                                help='number of worker processes')
+    compile_parser.add_argument('-c', '--codel-size', type=int, default=1)
+    compile_parser.add_argument('--band-height', type=int, default=None,
+                                help='stream the image in bands of rows')
+    compile_parser.add_argument('--no-optimize', action='store_true',
+                                help='skip the peephole pass')
+    compile_parser.add_argument('--cache-dir',
+                                default=os.environ.get('PIETC_CACHE_DIR'),
+                                help='reuse unchanged forms and files from '
+                                'this cache (default: $PIETC_CACHE_DIR)')
+    compile_parser.add_argument('--cache-size', type=int, default=None,
+                                help='cache size limit in MiB')
+    compile_parser.set_defaults(func=compile_command)
+    stats_parser = commands.add_parser(
+        'stats', help='report what each definition adds to the image')
+    stats_parser.add_argument('paths', nargs='+',
+                              help='source files or directories')
+    stats_parser.add_argument('-c', '--codel-size', type=int, default=1)
+    stats_parser.add_argument('--json', action='store_true',
+                              help='print the report as JSON')
+    stats_parser.add_argument('--no-optimize', action='store_true',
+                              help='skip the peephole pass')
+    stats_parser.add_argument('--no-simulate', action='store_true',
+                              help='leave out branches instead of running '
+                              'the program to find the ones it takes')
+    stats_parser.set_defaults(func=stats_command)
+    run_parser = commands.add_parser(
+        'run', help='execute a Piet image and print its output')
+    run_parser.add_argument('image', help='PNG to execute')
+    run_parser.add_argument('input', nargs='?', default=None,
+                            help='input to the program (default: stdin)')
+    run_parser.add_argument('--max-steps', type=int, default=None,
+                            help='stop after this many steps')
+    run_parser.add_argument('--interpret', action='store_true',
+                            help='step through the image instead of '
+                            'translating it into Python first')
+    run_parser.set_defaults(func=run_command)
+    return parser
+
+def main (argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,5 +1,6 @@
 from functools import partial
-from pietc.debug import debuginfo, debugcontext
+from pietc import trace
+from pietc.parse import Form
 
 class LambdaError (RuntimeError):
     pass
@@ -21,24 +22,51 @@ class Environment (dict):
     invokes a call to `bind` by which a symbol (such as an argument to a lambda
     function) can be mapped to an object (such as a Parameter type) or value.
 
+    The environment that defines a symbol is cached per scope, so repeated
+    lookups of globals from nested scopes do not look into every scope of
+    the parent chain. A `bind` may only shadow a symbol for the scopes below
+    it, so every cached entry holds the `version` of the parent chain that
+    it was found in, and binds in unrelated scopes leave it valid.
+
     """
     def __init__ (self, base_dict={}, parent_env=None):
         self.update(base_dict)
         self.parent = parent_env
+        self.resolved = {}
+        self.folded = {}
+        self.binds = 0
+
+    @property
+    def version (self):
+        """
+        The number of binds in this scope and in every scope above it,
+        which are the only ones that can change what a symbol resolves to.
+        """
+        version = 0
+        env = self
+        while env is not None:
+            version += env.binds
+            env = env.parent
+        return version
 
     def reference_environment (self, key):
-        try:
-            if key in self:
-                return self
-            else:
-                return self.parent.reference_environment(key)
-        except (KeyError, AttributeError):
+        if key in self:
+            return self
+        if self.parent is None:
             raise KeyError('undefined symbol: %s' % str(key))
+        version = self.parent.version
+        cached = self.resolved.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        env = self.parent.reference_environment(key)
+        self.resolved[key] = (version, env)
+        return env
 
     def lookup (self, key):
         return self.reference_environment(key)[key]
 
     def bind (self, key, value):
+        self.binds += 1
         self.update({key : value})
 
     def __repr__ (self):
@@ -97,18 +125,16 @@ class Sequence (list):
      Command(roll),
      Command(pop)]
 
-    Once the LambdaSequence is reached, we can evaluate it similarly.
+    Once the LambdaSequence is reached, we can evaluate it similarly. Since
+    `x` is bound to a literal, the multiplication is folded at compile time.
 
     >>> res.expand(); list(res)
-    [Push(2),
-     Push(1),
-     Push(-1),
-     Command(roll),
-     Command(duplicate),
-     Push(2),
-     Push(1),
-     Command(roll),
-     Command(multiply)]
+    [Push(20)]
+
+    `origins` attributes the statements to the source they came from: each
+    `(index, span)` pair covers the statements from `index` up to the next
+    pair with the `pietc.parse.Span` of the innermost form that emitted them
+    (or `None`).
 
     """
     def __init__ (self, sexpr, env):
@@ -119,6 +145,23 @@ class Sequence (list):
         self.env = env
         self.expanded = False
         self.eval_result = None
+        self.origins = []
+        # the symbol that the sequence was first defined as, if any.
+        self.name = None
+
+    @property
+    def origin (self):
+        """The Span that statements appended now are attributed to."""
+        return self.origins[-1][1] if self.origins else None
+
+    def mark (self, span):
+        """Attribute the statements appended from now on to `span`."""
+        origins = self.origins
+        if origins and origins[-1][0] == len(self):
+            # nothing was appended since the last mark.
+            origins.pop()
+        if span is not self.origin:
+            origins.append((len(self), span))
 
     def peek_sexpr (self):
         """Return a simplification of the Sequence if possible."""
@@ -130,26 +173,67 @@ class Sequence (list):
         if isinstance(procedure, str) and procedure in LOOKUPPROC \
            and procedure != 'define':
             return LOOKUPPROC[procedure](self.env, args)
+        value = fold_constant(self.sexpr, self.env)
+        if value is not None:
+            return value
         return self
 
-    def expand(self, debug=True):
-        """Expand the s-expression using `evaluate`."""
+    def expand(self):
+        """
+        Expand the s-expression using `evaluate`. The expansion is traced
+        like any other evaluation, so nested lambda bodies emit their events
+        in whichever categories are enabled.
+        """
         if self.expanded:
             return self.eval_result
-        with debugcontext(debug):
-            res = evaluate(self.sexpr, self.env, self)
+        res = evaluate(self.sexpr, self.env, self)
         self.expanded = True
         self.eval_result = res
         return self.eval_result
 
     def __call__ (self, seq, *args):
         function = self.expand()
-        debuginfo('{}({})', function, args, prefix='sequence call')
+        if trace.enabled('sequence'):
+            trace.emit('sequence', function=function, args=list(args))
         return function(seq, *args)
 
     def __repr__ (self):
         return '{}({})'.format(self.__class__.__name__, self.sexpr)
 
+class DeferredSequence (Sequence):
+    """
+    Represent a part of a lambda body that is only expanded once it runs,
+    such as the test and the branches of a Conditional.
+
+    `frame` holds the LambdaSequence of the body and its stack offset where
+    the sequence runs. The body has been expanded further by then, so the
+    offset is set back while the sequence expands, and what the sequence
+    pushes and pops is tracked on the body (see `stack_frame`).
+
+    """
+    def __init__ (self, sexpr, env, frame=None):
+        super().__init__(sexpr, env)
+        self.frame = frame
+
+    def expand (self):
+        if self.expanded or self.frame is None:
+            return super().expand()
+        lamda_seq, offset = self.frame
+        outer = lamda_seq.stack_offset
+        lamda_seq.stack_offset = offset
+        try:
+            return super().expand()
+        finally:
+            lamda_seq.stack_offset = outer
+
+def stack_frame (seq):
+    """Return the LambdaSequence whose stack `seq` runs on, if any."""
+    if isinstance(seq, LambdaSequence):
+        return seq
+    if isinstance(seq, DeferredSequence) and seq.frame is not None:
+        return seq.frame[0]
+    return None
+
 class MacroSequence (Sequence):
     """
     Represents a Sequence that may be referred to more than once.
@@ -170,6 +254,15 @@ class LambdaSequence (MacroSequence):
     Note that all lambdas are defined as dedicated function calls, even if they
     are not bound to a symbol.
 
+    The arguments are pushed in the order given by `Lambda.order`, and
+    `slots` lists the values that the body keeps beneath its operands, from
+    the deepest: the parameters, followed by the common subexpressions that
+    have been computed so far (see `common_value`). `reads` counts the reads
+    left of every parameter that may be consumed: the last read moves the
+    argument to the top of the stack instead of copying it (see
+    `last_read`), after which it is in `consumed` and no longer needs to be
+    popped by the caller.
+
     """
     def __init__ (self, lamda, args):
         self.lamda = lamda
@@ -178,43 +271,540 @@ class LambdaSequence (MacroSequence):
                                 self.lamda.params))
         self.local_env = Environment(dict(zip(self.lamda.params, self.params)),
                                      parent_env=self.lamda.env)
-        self.param_offset = dict(map(reversed,
-                                     enumerate(reversed(self.params))))
+        self.slots = [self.params[i] for i in self.lamda.order]
         self.stack_offset = 0
         popable_args = [arg for arg in self.args if is_pushable(arg)]
         self.stack_size = len(popable_args)
+        reads, deferred = self.lamda.reads
+        self.reads = dict((param, len(reads[param.symbol]))
+                          for param, arg in zip(self.params, self.args)
+                          if param.symbol in reads
+                          and param.symbol not in deferred
+                          and is_stacked(arg))
+        self.consumed = set()
+        self.common = {}
+        self.computing = set()
+        for key, (sexpr, count) in self.lamda.common.items():
+            # constant arguments may make a subexpression free to fold.
+            if fold_constant(sexpr, self.local_env) is not None \
+               or not saves_commands(sexpr, count, self.local_env):
+                continue
+            self.common[key] = count
+            # only the first occurrence reads the parameters in it.
+            for param in self.params:
+                if param in self.reads:
+                    self.reads[param] -= (count - 1) * occurrences(
+                        sexpr, param.symbol)
         super().__init__(self.lamda.sexpr, self.local_env)
 
-    def param_depth (self, param):
-        return self.stack_offset + self.param_offset[param]
+    def param_depth (self, key):
+        """Return the depth of a slot beneath the operands on the stack."""
+        if key not in self.slots:
+            raise LambdaError('lambda: {} read after its last read'.format(
+                key.symbol if isinstance(key, Parameter) else key))
+        return self.stack_offset + len(self.slots) - 1 - self.slots.index(key)
+
+    def release (self, key):
+        """Forget a slot that has been moved to the top of the stack."""
+        self.slots.remove(key)
+        if isinstance(key, Parameter):
+            self.consumed.add(key)
+
+    def common_value (self, sexpr):
+        """
+        Emit a common subexpression of the body and return `True`, or return
+        `False` if `sexpr` is not one.
+
+        The first occurrence is evaluated as usual, then duplicated and the
+        copy is buried beneath the operands in flight as a new slot. Later
+        occurrences read that slot like a parameter, and the last one
+        consumes it.
+        """
+        from pietc.piet import push_op, roll_op, duplicate_op, read_op, \
+            notify_stack_change
+        key = expression_key(sexpr)
+        if key not in self.common or key in self.computing:
+            return False
+        self.common[key] -= 1
+        if key in self.slots:
+            read_op(self, self, key, self.common[key] == 0)
+            return True
+        self.computing.add(key)
+        evaluate(sexpr, self.env, self)
+        self.computing.discard(key)
+        operands = self.stack_offset - 1
+        duplicate_op(self)
+        if operands:
+            push_op(self, operands + 1, 1)
+            roll_op(self)
+        self.slots.append(key)
+        notify_stack_change(self, -1)
+        return True
+
+    def drop_common (self):
+        """
+        Pop any common subexpression that was not read as often as expected,
+        so that only the parameters remain beneath the operands.
+        """
+        from pietc.piet import push_op, roll_op, pop_op
+        for key in [key for key in self.slots if key in self.common]:
+            depth = self.param_depth(key)
+            if depth != 0:
+                push_op(self, depth, -1)
+                roll_op(self)
+            self.slots.remove(key)
+            self.stack_offset += 1
+            pop_op(self)
+
+    def expand (self):
+        if self.expanded:
+            return self.eval_result
+        res = super().expand()
+        self.drop_common()
+        return res
+
+    def last_read (self, param):
+        """Count a read of `param` and return whether it is the last one."""
+        if param not in self.reads:
+            return False
+        self.reads[param] -= 1
+        return self.reads[param] == 0
 
     def __repr__ (self):
         return '{}({}, {})'.format(self.__class__.__name__,
                                    list(zip(self.lamda.params, self.args)),
                                    self.sexpr)
 
+class Label (object):
+    """Mark a position in a Sequence that a Jump may continue from."""
+    def __repr__ (self):
+        return '{}({:x})'.format(self.__class__.__name__, id(self) & 0xffff)
+
+class Jump (object):
+    """
+    Continue from a Label of the same Sequence.
+
+    A conditional Jump pops the top of the stack and is only taken if it is
+    zero, so it skips the branch of an `if` that is chosen by a true value.
+
+    """
+    def __init__ (self, label, conditional=False):
+        self.label = label
+        self.conditional = conditional
+
+    def __repr__ (self):
+        return '{}({}{})'.format(self.__class__.__name__, self.label,
+                                 ', conditional' if self.conditional else '')
+
+def mentions (sexpr, symbol):
+    """Return whether `symbol` appears anywhere in an s-expression."""
+    if isinstance(sexpr, list):
+        return any(mentions(item, symbol) for item in sexpr)
+    return sexpr == symbol
+
+def parameter_reads (sexpr, params):
+    """
+    Find where a lambda body reads its parameters.
+
+    Returns `(reads, deferred)`. `reads` maps every parameter to the
+    positions, in the order that `evaluate` visits them, at which the body
+    pushes it right away. `deferred` holds the parameters that are also read
+    where evaluation happens later or not at all (within an `if`, `lambda`,
+    `define` or `quote`), or that are called rather than pushed.
+
+    """
+    reads = {}
+    deferred = set()
+    position = [0]
+    def walk (sexpr):
+        if isinstance(sexpr, str):
+            if sexpr in params:
+                reads.setdefault(sexpr, []).append(position[0])
+                position[0] += 1
+            return
+        if not isinstance(sexpr, list) or not sexpr:
+            return
+        procedure, *args = sexpr
+        if procedure in LOOKUPPROC or procedure == 'if':
+            deferred.update(param for param in params if mentions(args, param))
+            return
+        if procedure in params:
+            deferred.add(procedure)
+        else:
+            walk(procedure)
+        for arg in args:
+            walk(arg)
+    walk(sexpr)
+    return reads, deferred
+
+def expression_key (sexpr):
+    return repr(sexpr)
+
+def occurrences (sexpr, symbol):
+    """Return how many times `symbol` appears in an s-expression."""
+    if isinstance(sexpr, list):
+        return sum(occurrences(item, symbol) for item in sexpr)
+    return int(sexpr == symbol)
+
+def is_pure (sexpr, params, env):
+    """
+    Return whether an s-expression only applies pure operators (those in
+    `pietc.piet.FOLDING`) to parameters and constants, and reads at least one
+    parameter, so that every evaluation of it leaves the same value.
+    """
+    from pietc.piet import FOLDING
+    if isinstance(sexpr, str):
+        if sexpr in params:
+            return True
+        try:
+            return constant_value(env.lookup(sexpr)) is not None
+        except KeyError:
+            return False
+    if not isinstance(sexpr, list):
+        return isinstance(sexpr, int)
+    if len(sexpr) < 2 or not isinstance(sexpr[0], str) or sexpr[0] in params:
+        return False
+    try:
+        if env.lookup(sexpr[0]) not in FOLDING:
+            return False
+    except (KeyError, TypeError):
+        return False
+    return all(is_pure(arg, params, env) for arg in sexpr[1:]) \
+        and any(mentions(sexpr, param) for param in params)
+
+def common_subexpressions (sexpr, params, env):
+    """
+    Find the pure subexpressions that a lambda body evaluates more than once.
+
+    Returns a dict from `expression_key` to `(sexpr, count)`, where `count`
+    is the number of times that the body evaluates it right away (as in
+    `parameter_reads`). Subexpressions of another common subexpression are
+    left out, since only its first occurrence evaluates them.
+
+    """
+    found = {}
+    def walk (sexpr):
+        if not isinstance(sexpr, list) or not sexpr:
+            return
+        procedure, *args = sexpr
+        if procedure in LOOKUPPROC or procedure == 'if':
+            return
+        if is_pure(sexpr, params, env):
+            key = expression_key(sexpr)
+            found[key] = (sexpr, found.get(key, (sexpr, 0))[1] + 1)
+        if isinstance(procedure, list):
+            walk(procedure)
+        for arg in args:
+            walk(arg)
+    walk(sexpr)
+    common = dict((key, value) for key, value in found.items()
+                  if value[1] > 1)
+    return dict((key, (sexpr, count)) for key, (sexpr, count) in common.items()
+                if not any(other != key and contains(outer, sexpr)
+                           for other, (outer, _) in common.items()))
+
+def contains (sexpr, part):
+    """Return whether `part` is a proper subexpression of `sexpr`."""
+    return isinstance(sexpr, list) \
+        and any(item == part or contains(item, part) for item in sexpr)
+
+def expression_cost (sexpr, env):
+    """Estimate the commands that evaluating a pure s-expression emits."""
+    from pietc.piet import OPERATOR_COMMANDS
+    if isinstance(sexpr, list):
+        operator = env.lookup(sexpr[0])
+        return OPERATOR_COMMANDS[operator] * max(1, len(sexpr) - 2) \
+            + sum(expression_cost(arg, env) for arg in sexpr[1:])
+    if constant_value(get_atom(env, sexpr)) is not None:
+        return 1
+    return PARAMETER_READ_COST
+
+# rolling a parameter to the top, duplicating it and rolling it back.
+PARAMETER_READ_COST = 7
+
+def saves_commands (sexpr, count, env):
+    """
+    Return whether keeping a subexpression on the stack is cheaper than
+    evaluating it `count` times: the first occurrence is duplicated and
+    buried (at most 4 commands), the others are read like parameters and the
+    last one is only rolled up (3 commands).
+    """
+    keep = 4 + PARAMETER_READ_COST * (count - 2) + 3
+    return expression_cost(sexpr, env) * (count - 1) > keep
+
+def is_tail_if (sexpr):
+    return isinstance(sexpr, list) and len(sexpr) in (3, 4) \
+        and sexpr[0] == 'if'
+
+def tail_calls (sexpr):
+    """Yield the procedure of every call in tail position of `sexpr`."""
+    if is_tail_if(sexpr):
+        for branch in sexpr[2:]:
+            yield from tail_calls(branch)
+    elif isinstance(sexpr, list) and sexpr:
+        yield sexpr[0]
+
+class LoopSequence (LambdaSequence):
+    """
+    Represent a Lambda whose only recursive calls are tail calls to itself.
+
+    Rather than expanding into a new LambdaSequence for every level of
+    recursion, the body is lowered once into a single subroutine with a
+    back-edge:
+
+    - every `if` in tail position that leads to a recursive call becomes a
+      conditional Jump over its `then` branch,
+    - a tail call pushes its arguments, rolls them beneath the current
+      parameters, pops those and jumps back to `start`,
+    - any other tail expression pushes its result, rolls it beneath the
+      parameters, pops them and jumps to `end`.
+
+    The parameters are therefore always the values on top of the stack when
+    an iteration starts, and the stack never grows with the recursion. Since
+    the parameters change at runtime, they are never bound to the values of a
+    particular call (nothing is folded), and the loop cleans up its own
+    arguments, leaving only its result.
+
+    Raises LambdaError if the body cannot be lowered this way, such as when
+    it recurses outside of a tail position or contains another Conditional,
+    whose choice could not change between iterations.
+
+    """
+    def __init__ (self, lamda, name):
+        super().__init__(lamda, [None] * len(lamda.params))
+        # every path through the loop needs all of the parameters, and
+        # common subexpressions are only shared within an expression.
+        self.reads = {}
+        self.common = {}
+        self.name = name
+        self.start = Label()
+        self.end = Label()
+        self.results = set()
+        self.append(self.start)
+        self.lower_tail(self.sexpr)
+        if len(self.results) != 1:
+            raise LambdaError('loop: exits leave different results')
+        if isinstance(self[-1], Jump) and self[-1].label is self.end:
+            self.pop()
+        self.append(self.end)
+        self.stack_offset = self.results.pop()
+        if has_conditional(self):
+            raise LambdaError('loop: conditional in loop body')
+        self.expanded = True
+
+    def emit (self, sexpr, values=None):
+        """Evaluate a non-recursive s-expression into the loop body."""
+        if mentions(sexpr, self.name):
+            raise LambdaError('loop: recursion outside of tail position')
+        start = self.stack_offset
+        self.common = dict(
+            (key, count) for key, (common, count)
+            in common_subexpressions(sexpr, self.lamda.params,
+                                     self.lamda.env).items()
+            if saves_commands(common, count, self.local_env))
+        evaluate(sexpr, self.env, self)
+        self.drop_common()
+        self.common = {}
+        if values is not None and self.stack_offset != start + values:
+            raise LambdaError('loop: {} does not leave {} value(s)'
+                              .format(sexpr, values))
+
+    def lower_tail (self, sexpr):
+        from pietc.piet import push_op, pop_op, roll_op
+        # only the parameters are on the stack at the start of a tail.
+        self.stack_offset = 0
+        size = len(self.params)
+        if type(sexpr) is Form and sexpr.span is not None:
+            # the jumps and cleanup of a tail belong to it as well.
+            outer = self.origin
+            self.mark(sexpr.span)
+            self.lower_tail(list(sexpr))
+            self.mark(outer)
+            return
+        if isinstance(sexpr, list) and sexpr and sexpr[0] == self.name:
+            args = sexpr[1:]
+            if len(args) != size:
+                raise LambdaError('lambda: invalid number of parameters')
+            for i in self.lamda.order:
+                self.emit(args[i], 1)
+            if size:
+                push_op(self, 2 * size - 1, size)
+                roll_op(self)
+                for _ in range(size):
+                    pop_op(self)
+            self.append(Jump(self.start))
+        elif is_tail_if(sexpr) and mentions(sexpr[2:], self.name):
+            test, then, *otherwise = sexpr[1:]
+            skip = Label()
+            self.emit(test, 1)
+            self.append(Jump(skip, conditional=True))
+            self.lower_tail(then)
+            self.append(skip)
+            self.lower_tail(otherwise[0] if otherwise else None)
+        else:
+            self.emit(sexpr)
+            results = self.stack_offset
+            if size and results:
+                push_op(self, size + results - 1, results)
+                roll_op(self)
+            for _ in range(size):
+                pop_op(self)
+            self.results.add(results)
+            self.append(Jump(self.end))
+
+    def __repr__ (self):
+        return '{}({}, {})'.format(self.__class__.__name__, self.name,
+                                   self.sexpr)
+
 class Lambda (object):
     """
     Define an s-expression that requires a local scope before it can evaluated.
+
+    Expansions are cached in `expansions` by the signature of their
+    arguments (see `signature`), so that call sites which would compile to
+    identical code share one LambdaSequence and thus one subroutine. The
+    body resolves globals as it expands, so every key also holds the
+    `Environment.version` of the scope it was defined in, and a `define`
+    there or above it (which may rebind one of them) keeps later calls from
+    reusing older expansions. Lambdas
+    that only call themselves in tail position are lowered into a single
+    LoopSequence instead (see `loop`).
+
     """
     def __init__ (self, params, sexpr, env):
         self.params = params
         self.sexpr = sexpr
         self.env = env
+        # the symbol that the lambda was first defined as, if any.
+        self.name = None
+        self.expansions = {}
+        self._reads = None
+        self._order = None
+        self._common = None
+
+    @property
+    def reads (self):
+        """The `parameter_reads` of the body."""
+        if self._reads is None:
+            self._reads = parameter_reads(self.sexpr, self.params)
+        return self._reads
+
+    @property
+    def common (self):
+        """The `common_subexpressions` of the body."""
+        # whether an operator is pure depends on what it is bound to.
+        version = self.env.version
+        if self._common is None or self._common[0] != version:
+            self._common = (version,
+                            common_subexpressions(self.sexpr, self.params,
+                                                  self.env))
+        return self._common[1]
+
+    @property
+    def order (self):
+        """
+        The indices of the parameters in the order their arguments are
+        pushed, so the last one ends up on top of the stack.
+
+        Parameters that are only ever read right away are pushed last, and
+        the sooner their last read the closer to the top, so that they can
+        be consumed with as shallow a roll as possible. The others keep
+        their order beneath them.
+        """
+        if self._order is None:
+            reads, deferred = self.reads
+            def last (i):
+                param = self.params[i]
+                if param not in reads or param in deferred:
+                    return (0, 0)
+                return (1, -reads[param][-1])
+            self._order = sorted(range(len(self.params)), key=last)
+        return self._order
+
+    @staticmethod
+    def signature (args):
+        """
+        Return a hashable description of the arguments of a call, or `None`
+        if the call should not be shared.
+
+        Literal arguments are described by their value (since they may be
+        folded into the body), values computed at runtime only by their
+        presence on the stack, and lambdas by their identity.
+
+        """
+        key = []
+        for arg in args:
+            val = arg.value if isinstance(arg, Parameter) else arg
+            if isinstance(val, int):
+                key.append(('const', val))
+            elif val is None or (isinstance(val, Sequence)
+                                 and not isinstance(val, Conditional)
+                                 and is_pushable(val)):
+                key.append(('stack',))
+            elif isinstance(val, Lambda):
+                key.append(('lambda', id(val)))
+            else:
+                return None
+        return tuple(key)
+
+    def loop (self, args):
+        """
+        Return the LoopSequence of a call if the Lambda is tail recursive
+        and every argument is on the stack, otherwise `None`.
+        """
+        names = set()
+        for procedure in tail_calls(self.sexpr):
+            if not isinstance(procedure, str) or procedure in self.params:
+                continue
+            try:
+                if self.env.lookup(procedure) is self:
+                    names.add(procedure)
+            except KeyError:
+                pass
+        if len(names) != 1 or not all(map(is_stacked, args)):
+            return None
+        key = ('loop', self.env.version) + tuple(names)
+        if key not in self.expansions:
+            try:
+                self.expansions[key] = LoopSequence(self, names.pop())
+            except LambdaError as err:
+                if trace.enabled('lambda'):
+                    trace.emit('lambda', lamda=self, loop=str(err))
+                self.expansions[key] = None
+        return self.expansions[key]
 
     def __call__ (self, seq, *args):
         # calling a lambda requires modifying the sequence.
-        from pietc.piet import push_op, pop_op, roll_op
+        from pietc.piet import push_op, pop_op, roll_op, notify_stack_change
         if len(args) != len(self.params):
             raise RuntimeError('lambda: invalid number of parameters')
-        debuginfo('{}({}, {})', self.__class__.__name__,
-                  list(zip(self.params, args)), self.sexpr,
-                  prefix='lambda call')
-        lamda_seq = LambdaSequence(self, args)
-        seq.append(lamda_seq)
-        lamda_seq.expand(debug=False)
+        if trace.enabled('lambda'):
+            trace.emit('lambda', lamda=self, args=list(args))
+        loop = self.loop(args)
+        if loop is not None:
+            # the loop pops its arguments and leaves its result.
+            seq.append(loop)
+            notify_stack_change(seq, loop.stack_offset - len(args))
+            return loop
+        key = self.signature(args)
+        if key is not None:
+            key = (self.env.version, key)
+        lamda_seq = self.expansions.get(key) if key is not None else None
+        if lamda_seq is not None:
+            seq.append(lamda_seq)
+        else:
+            lamda_seq = LambdaSequence(self, args)
+            seq.append(lamda_seq)
+            lamda_seq.expand()
+            # conditionals remember their choice, so they cannot be shared.
+            if key is not None and not has_conditional(lamda_seq):
+                self.expansions[key] = lamda_seq
+        # the values left by the body sit above the arguments, and include
+        # the arguments that the body consumed.
+        consumed = len(lamda_seq.consumed)
+        notify_stack_change(seq, lamda_seq.stack_offset - consumed)
         if lamda_seq.stack_offset != 0:
-            for _ in range(lamda_seq.stack_size):
+            for _ in range(lamda_seq.stack_size - consumed):
                 push_op(seq, 1, -1)
                 roll_op(seq)
                 pop_op(seq)
@@ -252,10 +842,10 @@ class Parameter (object):
     def __repr__ (self):
         return '{}({})'.format(self.__class__.__name__, self.symbol)
 
-    def __call__ (self, seq, args):
-        idx = self.lamda_seq.param_offset[self]
+    def __call__ (self, seq, *args):
+        idx = self.lamda_seq.params.index(self)
         function = self.lamda_seq.args[idx]
-        return function(seq, args)
+        return function(seq, *args)
 
 class Conditional (object):
     """
@@ -265,11 +855,13 @@ class Conditional (object):
     are not allowed to be evaluated until simulated or drawn.
 
     """
-    def __init__ (self, if_sexpr, else_sexpr, env):
+    def __init__ (self, if_sexpr, else_sexpr, env, frame=None):
         self.if_sexpr = if_sexpr
         self.else_sexpr = else_sexpr
         self.seq = None
         self.env = env
+        # where the branches run, see DeferredSequence.
+        self.frame = frame
 
     @property
     def has_choice (self):
@@ -282,11 +874,12 @@ class Conditional (object):
     @choice.setter
     def choice (self, value):
         sexpr = self.if_sexpr if value else self.else_sexpr
-        self.seq = Sequence(sexpr, self.env)
+        self.seq = DeferredSequence(sexpr, self.env, self.frame)
 
     def __call__ (self, seq, *args):
         from pietc.piet import push_op, pop_op, roll_op
-        debuginfo('{}({})', self, args, prefix='conditional call')
+        if trace.enabled('conditional'):
+            trace.emit('conditional', conditional=self, args=list(args))
         if not self.has_choice:
             cond_lamda = ConditionalLambda(self, args)
             popable_args = [arg for arg in args if is_pushable(arg)]
@@ -306,7 +899,6 @@ class Conditional (object):
 class ConditionalLambda (Conditional, MacroSequence):
     """Represent a Conditional with stored arguments."""
     def __init__ (self, conditional, args):
-        print(args)
         self.conditional = conditional
         self.args = list(args)
 
@@ -335,17 +927,110 @@ def is_pushable (atom):
     if isinstance(atom, Parameter):
         atom = atom.value
     if isinstance(atom, Sequence):
-        atom.expand(debug=False)
-        return True if atom else False
+        atom.expand()
+        # a lambda that returns an argument it consumed may be empty.
+        return bool(atom) or (isinstance(atom, LambdaSequence)
+                              and atom.stack_offset > 0)
     if not isinstance(atom, Atom):
         return False
     return True
 
+def is_stacked (arg):
+    """Return whether an evaluated argument left a value on the stack."""
+    if isinstance(arg, Parameter):
+        arg = arg.value
+    return arg is None or isinstance(arg, int) \
+        or (isinstance(arg, Sequence) and not isinstance(arg, Conditional)
+            and is_pushable(arg))
+
+def has_conditional (seq, visited=None):
+    """Return whether an expanded Sequence contains a Conditional."""
+    if visited is None:
+        visited = set()
+    visited.add(id(seq))
+    for stmt in seq:
+        if isinstance(stmt, Conditional):
+            return True
+        if isinstance(stmt, Sequence) and id(stmt) not in visited \
+           and (not stmt.expanded or has_conditional(stmt, visited)):
+            return True
+    return False
+
+def callee (operator):
+    """
+    Return the Lambda that calling `operator` ends up calling, or `None`.
+
+    Sequences and parameters call whatever they evaluate to, so their
+    arguments must be pushed in the order of that Lambda as well.
+    """
+    seen = set()
+    while id(operator) not in seen:
+        seen.add(id(operator))
+        if isinstance(operator, Lambda):
+            return operator
+        if isinstance(operator, Parameter):
+            operator = operator.value
+        elif isinstance(operator, Sequence) \
+             and not isinstance(operator, Conditional):
+            operator = operator.expand()
+        else:
+            return None
+    return None
+
 def get_atom (env, atom):
     if isinstance(atom, str):
         return env.lookup(atom)
     return atom
 
+def constant_value (val):
+    """Return the integer that `val` is known to hold, or `None`."""
+    if isinstance(val, Parameter):
+        val = val.value
+    return val if isinstance(val, int) else None
+
+def fold_constant (sexpr, env):
+    """
+    Compute an s-expression at compile time if possible.
+
+    Returns the integer result when `sexpr` is a literal, a symbol bound to
+    a constant (including a lambda parameter bound to a literal argument) or
+    a call to one of the pure operators in `pietc.piet.FOLDING` whose
+    arguments can all be folded. Otherwise, returns `None`.
+
+    `evaluate` tries to fold every call before evaluating its arguments, so
+    the result for each list is kept in `env.folded` along with the
+    `version` of `env`, and a nested call is only folded once per scope.
+
+    """
+    if not isinstance(sexpr, list):
+        try:
+            return constant_value(get_atom(env, sexpr))
+        except KeyError:
+            return None
+    return fold_call(sexpr, env, env.version)
+
+def fold_call (sexpr, env, version):
+    from pietc.piet import FOLDING
+    cached = env.folded.get(id(sexpr))
+    if cached is not None and cached[0] is sexpr and cached[1] == version:
+        return cached[2]
+    value = None
+    try:
+        fold = FOLDING.get(env.lookup(sexpr[0])) \
+            if sexpr and isinstance(sexpr[0], str) else None
+    except (KeyError, TypeError):
+        fold = None
+    if fold is not None:
+        args = [fold_call(arg, env, version) if isinstance(arg, list)
+                else fold_constant(arg, env) for arg in sexpr[1:]]
+        if None not in args:
+            try:
+                value = fold(*args)
+            except ZeroDivisionError:
+                pass
+    env.folded[id(sexpr)] = (sexpr, version, value)
+    return value
+
 def procedure_call (env, args, proc, arg_count=None):
     """Generic function for invoking a procedure."""
     if arg_count and len(args) != arg_count:
@@ -360,7 +1045,10 @@ def quote_proc (env, *args):
 def define_proc (env, *args):
     """Bind a symbol to an s-expression."""
     sym, sexpr = args
-    env.bind(sym, MacroSequence(sexpr, env).peek_sexpr())
+    value = MacroSequence(sexpr, env).peek_sexpr()
+    if isinstance(value, (Lambda, MacroSequence)) and value.name is None:
+        value.name = sym
+    env.bind(sym, value)
 
 def lambda_proc (env, *args):
     """Store an s-expression as a Lambda."""
@@ -392,13 +1080,24 @@ def evaluate (sexpr, env, seq):
     an occurance indicates that context is required to continue evaluation.
     Otherwise, this function returns `None`.
 
+    The statements that a Form appends to `seq` are attributed to its span
+    (see `Sequence.origins`).
+
     """
     from pietc.piet import push_op
-    debuginfo('{}', sexpr, prefix='evaluating')
+    # definitions, lambdas and quotes never append anything themselves.
+    if type(sexpr) is Form and sexpr.span is not seq.origin \
+       and not (sexpr and isinstance(sexpr[0], str)
+                and sexpr[0] in LOOKUPPROC):
+        return evaluate_form(sexpr, env, seq)
+    if trace.enabled('evaluate'):
+        trace.emit('evaluate', sexpr=sexpr)
     if not isinstance(sexpr, list):
         val = get_atom(env, sexpr)
         if is_pushable(val):
-            push_op(seq, val)
+            # parameters bound to literals are pushed rather than copied.
+            const = constant_value(val)
+            push_op(seq, val if const is None else const)
         return val
     # procedures are functions that manipulate program flow and the environment.
     procedure, *args = sexpr
@@ -406,7 +1105,34 @@ def evaluate (sexpr, env, seq):
         return LOOKUPPROC[procedure](env, args)
     elif procedure == 'if':
         return env.lookup(procedure)(seq, *args)
-    # operators are functions that manipulate the sequence.
-    operator, *operand = map(partial(evaluate, env=env, seq=seq), sexpr)
-    debuginfo('{}({})', operator, operand, prefix='executing')
+    # operators whose arguments are all known are computed here instead.
+    value = fold_constant(sexpr, env)
+    if value is not None:
+        push_op(seq, value)
+        return value
+    # pure subexpressions that a lambda repeats are only computed once.
+    if isinstance(seq, LambdaSequence) and env is seq.env \
+       and seq.common_value(sexpr):
+        return None
+    # operators are functions that manipulate the sequence. The arguments of
+    # a lambda are pushed in the order that it reads them.
+    operator = evaluate(procedure, env, seq)
+    order = range(len(args))
+    lamda = callee(operator)
+    if lamda is not None and len(args) == len(lamda.params):
+        order = lamda.order
+    operand = [None] * len(args)
+    for i in order:
+        operand[i] = evaluate(args[i], env, seq)
+    if trace.enabled('execute'):
+        trace.emit('execute', operator=operator, operands=operand)
     return operator(seq, *operand)
+
+def evaluate_form (sexpr, env, seq):
+    """Evaluate a Form, attributing what it appends to `seq` to its span."""
+    outer = seq.origin
+    seq.mark(sexpr.span)
+    try:
+        return evaluate(sexpr, env, seq)
+    finally:
+        seq.mark(outer)
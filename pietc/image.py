@@ -1,3 +1,4 @@
+import zlib
 import numpy as np
 import itertools as it
 from random import randrange, seed
@@ -33,6 +34,11 @@ CURRENT_COLOR = COLORNAMES[randrange(len(COLORNAMES))]
 
 CODELLEN = 16
 BUSWIDTH = 3
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+class NotDrawable (RuntimeError):
+    """A program with control flow that a straight-line image cannot hold."""
+    pass
 
 class Codel (object):
     def __init__ (self, context, color=CURRENT_COLOR):
@@ -125,7 +131,231 @@ class Context (object):
     def draw (self):
         pass
 
+PALETTE = np.array(COLORVALS.tolist(), dtype=np.uint8)
+
+def block_indices (shifts, start=(0, 0)):
+    """
+    Return the `(len(shifts) + 1, 2)` color indices of the blocks that
+    realize a sequence of `(hue, lightness)` shifts, starting from `start`.
+    """
+    steps = np.concatenate(([start], np.reshape(shifts, (-1, 2))))
+    return np.cumsum(steps, axis=0) % COLORSHAPE
+
+def block_colors (shifts, start=(0, 0)):
+    """Return the RGB colors of the blocks given by `block_indices`."""
+    idxs = block_indices(shifts, start)
+    return PALETTE[idxs[:, 0], idxs[:, 1]]
+
+def _paint (commands, start, final):
+    """
+    Paint one row per command and, if `final`, the halting block. Returns
+    the pixels along with the color index of the block that follows.
+    """
+    from pietc.piet import COMMAND_DIFFERENTIALS
+    names = [cmd[0] if isinstance(cmd, tuple) else cmd.name
+             for cmd in commands]
+    widths = np.ones(len(names) + 1, dtype=np.intp)
+    for idx, cmd in enumerate(commands):
+        if names[idx] == 'push':
+            value = cmd[1] if isinstance(cmd, tuple) else cmd.value
+            if not 0 < value <= CODELLEN:
+                raise RuntimeError('codel overflow')
+            widths[idx] = value
+    idxs = block_indices([COMMAND_DIFFERENTIALS[name] for name in names],
+                         start)
+    colors = PALETTE[idxs[:, 0], idxs[:, 1]]
+    height, width = len(names) + int(final), CODELLEN + 2
+    pixels = np.zeros((height, width, 3), dtype=np.uint8)
+    mask = np.arange(width) < widths[:height, None]
+    if final:
+        mask[-1] = True
+    pixels[mask] = np.repeat(colors[:height], mask.sum(axis=1), axis=0)
+    if final and height > 1:
+        pixels[-2, -1] = colors[-1]
+    return pixels, tuple(idxs[-1])
+
+def _scale (pixels, codel_size):
+    if codel_size != 1:
+        pixels = pixels.repeat(codel_size, axis=0).repeat(codel_size, axis=1)
+    return pixels
+
+def render (commands, start=(0, 0), codel_size=1):
+    """
+    Paint a straight-line sequence of commands into an RGB array.
+
+    Parameters
+    ==========
+
+    commands : list
+        Command objects (or `(name, value)` pairs), where every push has a
+        value between 1 and CODELLEN.
+    start : tuple
+        The `(hue, lightness)` index of the first block.
+    codel_size : int
+        Side length in pixels of each codel.
+
+    Each block sits at the left of its own row, so the program flows down
+    with the direction pointer facing down and the codel chooser to the
+    right (the first block is blocked to the right, which turns the pointer
+    after two retries). A block is as wide as the value pushed by the
+    command that leaves it. The last block also spans the full width of the
+    final row and reaches up the rightmost column, so that all eight exits
+    from it are blocked and the program halts.
+
+    Returns an `(H, W, 3)` uint8 array with `H = len(commands) + 1` and
+    `W = CODELLEN + 2` codels.
+
+    """
+    pixels, _ = _paint(list(commands), start, final=True)
+    return _scale(pixels, codel_size)
+
+def render_bands (commands, band_height=1024, start=(0, 0), codel_size=1):
+    """
+    Yield the pixels of `render(commands)` in bands of `band_height` codel
+    rows. `commands` may be any iterable, and is consumed one band ahead.
+    """
+    commands = iter(commands)
+    band = list(it.islice(commands, band_height))
+    while True:
+        following = list(it.islice(commands, band_height))
+        final = not following
+        pixels, start = _paint(band, start, final)
+        yield _scale(pixels, codel_size)
+        if final:
+            break
+        band = following
+
+def _png_chunk (kind, data):
+    chunk = kind + data
+    return (len(data).to_bytes(4, 'big') + chunk
+            + (zlib.crc32(chunk) & 0xffffffff).to_bytes(4, 'big'))
+
+def _png_header (width, height):
+    return _png_chunk(b'IHDR', width.to_bytes(4, 'big')
+                      + height.to_bytes(4, 'big') + bytes((8, 2, 0, 0, 0)))
+
+def write_png (path, bands, level=6):
+    """
+    Write an RGB PNG from an iterable of `(rows, W, 3)` uint8 bands.
+
+    Each band is filtered and fed to a single zlib stream as soon as it
+    arrives, and the compressed output is written out as IDAT chunks, so
+    only one band is held in memory at a time. The height is patched into
+    the header once every band has been written, which requires `path` to
+    be seekable. Returns the `(height, width)` of the image.
+
+    """
+    compressor = zlib.compressobj(level)
+    height = width = 0
+    with open(path, 'wb') as File:
+        File.write(PNG_SIGNATURE)
+        File.write(_png_header(0, 0))
+        for band in bands:
+            rows, width = band.shape[:2]
+            height += rows
+            scanlines = np.zeros((rows, 1 + 3 * width), dtype=np.uint8)
+            scanlines[:, 1:] = band.reshape(rows, -1)
+            data = compressor.compress(scanlines.tobytes())
+            if data:
+                File.write(_png_chunk(b'IDAT', data))
+        File.write(_png_chunk(b'IDAT', compressor.flush()))
+        File.write(_png_chunk(b'IEND', b''))
+        File.seek(len(PNG_SIGNATURE))
+        File.write(_png_header(width, height))
+    return height, width
+
+# a `roll` emitted by the compiler rotates `depth + 1` values, while piet
+# rotates `depth` of them. This fixes up a depth that is not a constant.
+ROLL_FIXUP = (('push', 2), ('push', 1), ('roll', None), ('push', 1),
+              ('add', None), ('push', 2), ('push', 1), ('roll', None),
+              ('roll', None))
+
+def attributed_commands (program, strict=True):
+    """
+    Yield the commands of `stream_commands` as `(name, value, number)`,
+    where `number` is the subroutine of the Bytecode that each of them was
+    lowered from.
+
+    Unless `strict`, branches and jumps are yielded as they are instead of
+    raising, so that programs which cannot be drawn can still be measured.
+
+    """
+    from pietc.ir import Bytecode
+    from pietc.synth import synthesize
+    ir = program if isinstance(program, Bytecode) else Bytecode(program)
+    def inline (number):
+        for name, arg in ir.commands(number):
+            if name == 'call':
+                yield from inline(arg)
+            elif strict and name == 'branch':
+                raise NotDrawable('cannot draw conditional')
+            elif strict and name in ('jump', 'jumpz'):
+                raise NotDrawable('cannot draw loop')
+            else:
+                yield name, arg, number
+    def lower (cmds):
+        for name, arg, number in cmds:
+            if name == 'push':
+                for cmd in synthesize(arg):
+                    yield cmd + (number,)
+            else:
+                yield name, arg, number
+    # the two latest commands are held back in case a roll follows them.
+    pending = []
+    for name, arg, number in inline(ir.root):
+        if name == 'roll':
+            if len(pending) == 2 and pending[0][0] == pending[1][0] == 'push':
+                pending[0] = ('push', pending[0][1] + 1, pending[0][2])
+                pending.append((name, arg, number))
+            else:
+                pending.extend(cmd + (number,) for cmd in ROLL_FIXUP)
+            yield from lower(pending)
+            pending = []
+        else:
+            pending.append((name, arg, number))
+            if len(pending) > 2:
+                yield from lower([pending.pop(0)])
+    yield from lower(pending)
+
+def stream_commands (program):
+    """
+    Inline every subroutine of an expanded Program and yield the result as
+    `(name, value)` commands for the piet interpreter.
+
+    Rolls are translated to the piet definition of their depth, and each
+    push is synthesized so that it fits in a codel. Conditionals cannot be
+    drawn as a straight line.
+
+    """
+    for name, arg, _ in attributed_commands(program):
+        yield name, arg
+
+def flatten (program):
+    """Return the commands of `stream_commands` as a list."""
+    return list(stream_commands(program))
+
+def draw_commands (commands, path, codel_size=1, band_height=None):
+    """
+    Render a command stream to a PNG at `path` and return its shape.
+
+    The whole image is rendered in memory and saved with Pillow, unless
+    `band_height` is given, in which case it is rendered and compressed
+    band by band with `write_png`.
+
+    """
+    if band_height is not None:
+        return write_png(path, render_bands(commands, band_height,
+                                            codel_size=codel_size))
+    pixels = render(commands, codel_size=codel_size)
+    Image.fromarray(pixels, 'RGB').save(path)
+    return pixels.shape[:2]
+
+def draw (program, path, codel_size=1, band_height=None):
+    """Render an expanded Program to a PNG at `path` (see `draw_commands`)."""
+    return draw_commands(stream_commands(program), path, codel_size,
+                         band_height)
+
 def shift_color (command, color=CURRENT_COLOR):
-    idx = tuple(map(np.mod, COLORIDXS[color] + command.shift, COLORSHAPE))
+    idx = tuple(map(np.mod, np.add(COLORIDXS[color], command.shift), COLORSHAPE))
     color[:] = COLORVALS[idx]
     return color
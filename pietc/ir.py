@@ -0,0 +1,231 @@
+from array import array
+from pietc.eval import Sequence, MacroSequence, Conditional, Label, Jump
+from pietc.piet import Command, Push
+from pietc.optimize import peephole
+
+PUSH, POP, ROLL, DUPLICATE, ADD, SUBTRACT, MULTIPLY, DIVIDE, MODULO, \
+    GREATER, NOT, CALL, BRANCH, RETURN, JUMP, JUMPZ = range(16)
+
+OPCODES = {
+    'push' : PUSH,
+    'pop' : POP,
+    'roll' : ROLL,
+    'duplicate' : DUPLICATE,
+    'add' : ADD,
+    'subtract' : SUBTRACT,
+    'multiply' : MULTIPLY,
+    'divide' : DIVIDE,
+    'mod' : MODULO,
+    'greater' : GREATER,
+    'not' : NOT,
+}
+
+OPNAMES = dict(map(reversed, OPCODES.items()))
+OPNAMES.update({CALL : 'call', BRANCH : 'branch', RETURN : 'return',
+                JUMP : 'jump', JUMPZ : 'jumpz'})
+
+class Bytecode (object):
+    """
+    A flat, array-backed representation of an expanded Program.
+
+    Every Sequence becomes a subroutine: a contiguous run of instructions in
+    `ops` and `args` that ends with a RETURN. The operand of each instruction
+    depends on its opcode:
+
+    PUSH
+        index of the value in `constants`.
+    CALL
+        index of the callee in `starts` (and `sequences`).
+    BRANCH
+        index of the Conditional in `branches`.
+    JUMP, JUMPZ
+        offset of the instruction to continue from. JUMPZ pops the top of
+        the stack and only jumps if it is zero.
+
+    `origins` holds, for every instruction, the index in `spans` of the
+    source form that emitted it or -1 (see `Sequence.origins`).
+
+    Subroutines are laid out callees first, so a CALL never needs patching.
+    Conditionals cannot be lowered ahead of time since their branches are
+    only evaluated once a choice is made. `resolve` lowers the chosen branch
+    on demand and appends it to the arrays; the target of each choice is
+    then kept in `targets`. Jumps only ever stay within a subroutine (see
+    `pietc.eval.LoopSequence`).
+
+    With `rules`, every run of commands between two other instructions is
+    rewritten by `pietc.optimize.peephole` as it is lowered, including the
+    branches lowered later by `resolve`. The Sequences themselves are left
+    as they are.
+
+    Examples
+    ========
+
+    >>> from pietc.ir import Bytecode
+    >>> ir = Bytecode(program)
+    >>> ir.commands(ir.root)
+    [('push', 5), ('call', 1), ...]
+
+    """
+    def __init__ (self, program=None, rules=None):
+        self.rules = rules
+        self.ops = array('B')
+        self.args = array('l')
+        self.constants = []
+        self.constant_index = {}
+        self.starts = []
+        self.sequences = []
+        self.index = {}
+        self.branches = []
+        self.targets = {}
+        self.origins = array('l')
+        self.spans = []
+        self.span_index = {}
+        self.root = None
+        if program is not None:
+            # the program itself is populated by `evaluate`, not expanded.
+            self.root = self.lower(program, expand=False)
+
+    def constant (self, value):
+        if value not in self.constant_index:
+            self.constant_index[value] = len(self.constants)
+            self.constants.append(value)
+        return self.constant_index[value]
+
+    def span (self, span):
+        if span is None:
+            return -1
+        if span not in self.span_index:
+            self.span_index[span] = len(self.spans)
+            self.spans.append(span)
+        return self.span_index[span]
+
+    def lower (self, seq, expand=True):
+        """Return the subroutine index of `seq`, lowering it if necessary."""
+        key = id(seq)
+        if key in self.index:
+            return self.index[key]
+        if expand:
+            seq.expand()
+        number = len(self.starts)
+        self.index[key] = number
+        # reserve the slot first so that recursive sequences resolve.
+        self.starts.append(None)
+        self.sequences.append(seq)
+        code = []
+        labels = {}
+        marks = dict(seq.origins)
+        origin = -1
+        run = []
+        for i, stmt in enumerate(seq):
+            if i in marks:
+                origin = self.span(marks[i])
+            if isinstance(stmt, Command):
+                run.append((stmt, origin))
+                continue
+            if run:
+                code.extend(self.encode(run))
+                run = []
+            if isinstance(stmt, Label):
+                labels[id(stmt)] = len(code)
+            elif isinstance(stmt, Jump):
+                code.append((JUMPZ if stmt.conditional else JUMP, stmt.label,
+                             origin))
+            elif isinstance(stmt, Conditional):
+                code.append((BRANCH, len(self.branches), origin))
+                self.branches.append(stmt)
+            elif isinstance(stmt, Sequence):
+                code.append((CALL, self.lower(stmt), origin))
+        if run:
+            code.extend(self.encode(run))
+        start = self.starts[number] = len(self.ops)
+        for op, arg, origin in code:
+            if op in (JUMP, JUMPZ):
+                arg = start + labels[id(arg)]
+            self.ops.append(op)
+            self.args.append(arg)
+            self.origins.append(origin)
+        self.ops.append(RETURN)
+        self.args.append(0)
+        self.origins.append(-1)
+        return number
+
+    def encode (self, run):
+        """
+        Return the instructions for a run of `(command, origin)` pairs,
+        after the peephole `rules` have been applied to it.
+        """
+        cmds = [cmd for cmd, _ in run]
+        origins = [origin for _, origin in run]
+        if self.rules:
+            cmds, origins = peephole(cmds, self.rules, origins)
+        return [(PUSH, self.constant(cmd.value), origin)
+                if isinstance(cmd, Push) else (OPCODES[cmd.name], 0, origin)
+                for cmd, origin in zip(cmds, origins)]
+
+    def resolve (self, branch, value):
+        """
+        Choose the target of a BRANCH given the popped `value` (or `None` if
+        the Conditional has already made its choice). Returns the subroutine
+        index of the target or `None` if it does nothing.
+        """
+        cond = self.branches[branch]
+        if value is not None:
+            cond.choice = value
+        target = cond.choice
+        if not isinstance(target, Sequence):
+            return None
+        number = self.lower(target)
+        self.targets[branch, id(target)] = number
+        return number
+
+    def origin (self, pc):
+        """Return the Span of the form that emitted an instruction."""
+        index = self.origins[pc]
+        return None if index < 0 else self.spans[index]
+
+    def name (self, number):
+        """
+        Return a readable name for a subroutine: the symbol its lambda or
+        s-expression was defined as, or else its kind and where it starts.
+        """
+        if number == self.root:
+            return 'program'
+        seq = self.sequences[number]
+        lamda = getattr(seq, 'lamda', None)
+        name = seq.name if lamda is None else lamda.name
+        if name is not None:
+            return name
+        kind = 'lambda' if lamda is not None else \
+            'macro' if isinstance(seq, MacroSequence) else 'sequence'
+        span = getattr(seq.sexpr, 'span', None)
+        if span is None:
+            return '{}#{}'.format(kind, number)
+        return '{}@{}'.format(kind, span)
+
+    def subroutine (self, number):
+        """Return the `(start, end)` offsets of a subroutine."""
+        start = self.starts[number]
+        end = start
+        while self.ops[end] != RETURN:
+            end += 1
+        return start, end
+
+    def commands (self, number):
+        """Return a subroutine as a list of `(name, operand)` pairs."""
+        start, end = self.subroutine(number)
+        res = []
+        for pc in range(start, end):
+            op, arg = self.ops[pc], self.args[pc]
+            if op == PUSH:
+                arg = self.constants[arg]
+            elif op not in (CALL, BRANCH, JUMP, JUMPZ):
+                arg = None
+            res.append((OPNAMES[op], arg))
+        return res
+
+    def __len__ (self):
+        return len(self.ops)
+
+    def __repr__ (self):
+        return '{}({} instructions, {} subroutines)'.format(
+            self.__class__.__name__, len(self.ops), len(self.starts))
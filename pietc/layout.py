@@ -0,0 +1,186 @@
+import sys
+import heapq
+from pietc.ir import Bytecode, PUSH, CALL, BRANCH
+from pietc.image import CODELLEN, BUSWIDTH
+
+# every track is as wide as a rendered command stream plus its bus.
+TRACKWIDTH = CODELLEN + 2 + BUSWIDTH
+
+class Segment (object):
+    """
+    A subroutine or conditional branch that is drawn once in a lane.
+
+    `anchor` is the row of the first call that reaches the segment, which is
+    where it would ideally start so that the bus to it stays short. `lane`
+    and `start` are assigned by the layout strategy.
+
+    """
+    def __init__ (self, number, sequence, length, anchor):
+        self.number = number
+        self.sequence = sequence
+        self.length = length
+        self.anchor = anchor
+        self.lane = None
+        self.start = None
+
+    @property
+    def end (self):
+        return self.start + self.length
+
+    def __repr__ (self):
+        return '{}({}, rows={}, lane={}, start={})'.format(
+            self.__class__.__name__, self.number, self.length, self.lane,
+            self.start)
+
+def naive_strategy (segments, height):
+    """Give every segment a lane of its own, starting at its anchor."""
+    for lane, seg in enumerate(segments, 1):
+        seg.lane, seg.start = lane, seg.anchor
+
+def interval_strategy (segments, height):
+    """
+    Start every segment at its anchor and reuse the lane that was freed
+    first, which uses as few lanes as segments overlap (interval
+    partitioning).
+    """
+    free = []
+    lanes = 0
+    for seg in sorted(segments, key=lambda seg: seg.anchor):
+        seg.start = seg.anchor
+        if free and free[0][0] <= seg.start:
+            _, seg.lane = heapq.heappop(free)
+        else:
+            lanes += 1
+            seg.lane = lanes
+        heapq.heappush(free, (seg.end, seg.lane))
+
+def pack_strategy (segments, height):
+    """
+    Stack segments in lanes as tall as the main track (or the longest
+    segment) using first-fit decreasing, ignoring their anchors.
+    """
+    height = max([height] + [seg.length for seg in segments])
+    filled = []
+    for seg in sorted(segments, key=lambda seg: -seg.length):
+        for lane, used in enumerate(filled):
+            if used + seg.length <= height:
+                break
+        else:
+            lane = len(filled)
+            filled.append(0)
+        seg.lane, seg.start = lane + 1, filled[lane]
+        filled[lane] += seg.length
+
+STRATEGIES = {
+    'naive' : naive_strategy,
+    'interval' : interval_strategy,
+    'pack' : pack_strategy,
+}
+
+def segment_rows (ir, number):
+    """
+    Return the rows that a subroutine needs on its own track along with the
+    offset of each call and branch within it.
+    """
+    from pietc.synth import synthesize
+    start, end = ir.subroutine(number)
+    rows = 0
+    calls = []
+    for pc in range(start, end):
+        op, arg = ir.ops[pc], ir.args[pc]
+        if op == PUSH:
+            rows += len(synthesize(ir.constants[arg]))
+        elif op == CALL:
+            calls.append((rows, arg))
+            rows += 1
+        elif op == BRANCH:
+            calls.extend((rows, target)
+                         for (branch, _), target in ir.targets.items()
+                         if branch == arg)
+            rows += 1
+        else:
+            rows += 1
+    return rows, calls
+
+class Layout (object):
+    """
+    Placement of the subroutines of a Program in lanes beside the main track.
+
+    Parameters
+    ==========
+
+    program : Program, Bytecode
+        The program to lay out. Branches are only placed once they have been
+        resolved, so pass the Bytecode of a Simulator that has run to include
+        them.
+    strategy : str
+        One of STRATEGIES.
+
+    The main track holds the top-level commands of the program. Every other
+    subroutine is drawn once as a Segment, no matter how often it is called,
+    and each lane is TRACKWIDTH codels wide.
+
+    """
+    def __init__ (self, program, strategy='interval'):
+        self.ir = program if isinstance(program, Bytecode) \
+            else Bytecode(program)
+        self.strategy = strategy
+        self.main, calls = segment_rows(self.ir, self.ir.root)
+        self.segments = []
+        placed = set([self.ir.root])
+        pending = list(calls)
+        # segments are anchored breadth first, below the call that reaches
+        # them first.
+        while pending:
+            row, number = pending.pop(0)
+            if number in placed:
+                continue
+            length, calls = segment_rows(self.ir, number)
+            placed.add(number)
+            if length == 0:
+                continue
+            self.segments.append(Segment(number, self.ir.sequences[number],
+                                         length, row))
+            pending.extend((row + offset, callee) for offset, callee in calls)
+        STRATEGIES[strategy](self.segments, self.main)
+
+    @property
+    def lanes (self):
+        return max([0] + [seg.lane for seg in self.segments])
+
+    @property
+    def shape (self):
+        """The `(height, width)` of the image in codels."""
+        height = max([self.main] + [seg.end for seg in self.segments])
+        return height, TRACKWIDTH * (1 + self.lanes)
+
+    @property
+    def area (self):
+        height, width = self.shape
+        return height * width
+
+    def pixels (self, codel_size=1):
+        return self.area * codel_size ** 2
+
+    def report (self, codel_size=1):
+        height, width = self.shape
+        return '{:<9} {:>4} lanes {:>8} x {:<4} codels {:>10} pixels'.format(
+            self.strategy, self.lanes, height, width,
+            self.pixels(codel_size))
+
+    def __repr__ (self):
+        return '{}({}, {} segments, shape={})'.format(
+            self.__class__.__name__, self.strategy, len(self.segments),
+            self.shape)
+
+def compare (program):
+    """Return a Layout for every strategy, from smallest to largest."""
+    ir = program if isinstance(program, Bytecode) else Bytecode(program)
+    return sorted((Layout(ir, name) for name in STRATEGIES),
+                  key=lambda layout: layout.area)
+
+if __name__ == '__main__':
+    from pietc import compile_source
+    program = compile_source(sys.argv[1])
+    for layout in compare(program):
+        print(layout.report())
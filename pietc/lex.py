@@ -1,5 +1,12 @@
+import sys
 from ply.lex import lex
 
+# the master regular expression is shipped as `pietc/lextab.py`. It is
+# rewritten on first use whenever it is missing.
+LEXTAB = 'pietc.lextab'
+
+_lexer = None
+
 tokens = (
     'LPAREN',
     'RPAREN',
@@ -58,4 +65,17 @@ def t_newline (tok):
     r'\n+'
     tok.lexer.lineno += len(tok.value)
 
-lexer = lex()
+def get_lexer ():
+    """Return the lexer, constructing it on first use."""
+    global _lexer
+    if _lexer is None:
+        _lexer = lex(module=sys.modules[__name__], optimize=True,
+                     lextab=LEXTAB)
+    return _lexer
+
+def __getattr__ (name):
+    # `lexer` is constructed lazily so that importing this module is cheap.
+    if name == 'lexer':
+        return get_lexer()
+    raise AttributeError('module {!r} has no attribute {!r}'
+                         .format(__name__, name))
@@ -0,0 +1,10 @@
+# lextab.py. This file automatically created by PLY (version 3.11). Don't edit!
+_tabversion   = '3.10'
+_lextokens    = set(('BOOL', 'CHAR', 'INTEGER', 'LPAREN', 'NIL', 'QUOTE', 'RPAREN', 'STRING', 'SYMBOL'))
+_lexreflags   = 64
+_lexliterals  = ''
+_lexstateinfo = {'INITIAL': 'inclusive'}
+_lexstatere   = {'INITIAL': [('(?P<t_STRING>"(\\\\"|\\\\n|[a-zA-Z0-9*+/!?=<>. -])*")|(?P<t_INTEGER>-?[0-9]+)|(?P<t_BOOL>\\#t|\\#f)|(?P<t_CHAR>\\#\\\\(space|newline|.))|(?P<t_NIL>nil)|(?P<t_newline>\\n+)|(?P<t_SYMBOL>[a-zA-Z!$%&*+./:<=>?"@^_~-][0-9a-zA-Z!$%&*+./:<=>?"@^_~-]*)|(?P<t_ignore_COMMENT>;[^\\n]*)|(?P<t_LPAREN>\\()|(?P<t_RPAREN>\\))|(?P<t_QUOTE>\')', [None, ('t_STRING', 'STRING'), None, ('t_INTEGER', 'INTEGER'), ('t_BOOL', 'BOOL'), ('t_CHAR', 'CHAR'), None, ('t_NIL', 'NIL'), ('t_newline', 'newline'), (None, 'SYMBOL'), (None, None), (None, 'LPAREN'), (None, 'RPAREN'), (None, 'QUOTE')])]}
+_lexstateignore = {'INITIAL': ' \t'}
+_lexstateerrorf = {'INITIAL': 't_error'}
+_lexstateeoff = {}
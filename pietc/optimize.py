@@ -0,0 +1,182 @@
+import sys
+from pietc.eval import Sequence, Conditional
+from pietc.piet import Command, Push
+
+def is_push (cmd, value=None):
+    return isinstance(cmd, Push) and (value is None or cmd.value == value)
+
+def is_command (cmd, name):
+    return isinstance(cmd, Command) and not isinstance(cmd, Push) \
+        and cmd.name == name
+
+def is_roll (cmds, i):
+    """Return `(depth, count)` if `cmds[i:i+3]` is a constant roll."""
+    if i + 2 < len(cmds) and is_push(cmds[i]) and is_push(cmds[i+1]) \
+       and is_command(cmds[i+2], 'roll'):
+        return cmds[i].value, cmds[i+1].value
+    return None
+
+def roll_noop_rule (cmds, i):
+    """`push d; push c; roll` with nothing to rotate."""
+    roll = is_roll(cmds, i)
+    if roll and roll[0] >= 0 and roll[1] % (roll[0] + 1) == 0:
+        return 3, []
+    return None
+
+def roll_merge_rule (cmds, i):
+    """Two rolls of the same depth become one (or none if they cancel)."""
+    first = is_roll(cmds, i)
+    second = is_roll(cmds, i + 3)
+    if first and second and first[0] == second[0] and first[0] >= 0:
+        depth = first[0]
+        count = (first[1] + second[1]) % (depth + 1)
+        if count == 0:
+            return 6, []
+        return 6, [Push(depth), Push(count), Command('roll')]
+    return None
+
+def double_not_rule (cmds, i):
+    """`not; not` after a command that already produced 0 or 1."""
+    if i + 2 < len(cmds) and (is_command(cmds[i], 'not')
+                              or is_command(cmds[i], 'greater')) \
+       and is_command(cmds[i+1], 'not') and is_command(cmds[i+2], 'not'):
+        return 3, [cmds[i]]
+    return None
+
+def dead_push_rule (cmds, i):
+    """A value that is pushed or duplicated and then immediately popped."""
+    if i + 1 < len(cmds) and (is_push(cmds[i])
+                              or is_command(cmds[i], 'duplicate')) \
+       and is_command(cmds[i+1], 'pop'):
+        return 2, []
+    return None
+
+def pop_under_rule (cmds, i):
+    """
+    Merge repeated `push 1; push -1; roll; pop`, which each drop the value
+    beneath the top of the stack, into a single roll followed by the pops.
+    """
+    count = 0
+    j = i
+    while is_roll(cmds, j) == (1, -1) and j + 3 < len(cmds) \
+          and is_command(cmds[j+3], 'pop'):
+        count += 1
+        j += 4
+    if count < 2:
+        return None
+    return j - i, [Push(count), Push(1), Command('roll')] \
+        + [Command('pop') for _ in range(count)]
+
+RULES = [
+    roll_noop_rule,
+    roll_merge_rule,
+    double_not_rule,
+    dead_push_rule,
+    pop_under_rule,
+]
+
+def peephole (cmds, rules=RULES, tags=None):
+    """
+    Rewrite a straight-line list of commands until no rule applies.
+
+    If `tags` holds a value for every command (such as where it came from),
+    a list of the values for the result is returned as well. A replacement
+    takes the tag of the first command it replaces.
+    """
+    cmds = list(cmds)
+    marks = [None] * len(cmds) if tags is None else list(tags)
+    changed = True
+    while changed:
+        changed = False
+        res = []
+        res_marks = []
+        i = 0
+        while i < len(cmds):
+            for rule in rules:
+                match = rule(cmds, i)
+                if match is not None:
+                    length, replacement = match
+                    res.extend(replacement)
+                    res_marks.extend([marks[i]] * len(replacement))
+                    i += length
+                    changed = True
+                    break
+            else:
+                res.append(cmds[i])
+                res_marks.append(marks[i])
+                i += 1
+        cmds = res
+        marks = res_marks
+    if tags is None:
+        return cmds
+    return cmds, marks
+
+class PeepholeStats (object):
+    """Instruction counts before and after a call to `optimize`."""
+    def __init__ (self):
+        self.before = 0
+        self.after = 0
+        self.sequences = 0
+
+    def __repr__ (self):
+        return '{}(before={}, after={}, sequences={})'.format(
+            self.__class__.__name__, self.before, self.after, self.sequences)
+
+def optimize (seq, rules=RULES, stats=None, visited=None):
+    """
+    Apply the peephole rules to every expanded Sequence reachable from `seq`.
+
+    Commands are only rewritten within runs that contain no nested Sequence
+    or Conditional, since those are jumps in the final program. Sequences
+    that have not been expanded yet (such as the branches of a Conditional)
+    are left alone. Returns a PeepholeStats.
+
+    The `origins` of a rewritten Sequence are moved along with its
+    statements, and those that started within a run of commands now start
+    with the run.
+
+    """
+    if stats is None:
+        stats = PeepholeStats()
+    if visited is None:
+        visited = set()
+    if id(seq) in visited:
+        return stats
+    visited.add(id(seq))
+    stats.sequences += 1
+    res = []
+    run = []
+    marks = dict(seq.origins)
+    origins = []
+    for i, stmt in enumerate(seq):
+        if isinstance(stmt, Command):
+            if i in marks:
+                origins.append((len(res), marks[i]))
+            run.append(stmt)
+            continue
+        if run:
+            res.extend(peephole(run, rules))
+            stats.before += len(run)
+            run = []
+        if i in marks:
+            origins.append((len(res), marks[i]))
+        res.append(stmt)
+        if isinstance(stmt, Sequence) and not isinstance(stmt, Conditional) \
+           and stmt.expanded:
+            optimize(stmt, rules, stats, visited)
+    if run:
+        res.extend(peephole(run, rules))
+        stats.before += len(run)
+    seq[:] = res
+    seq.origins = [(index, span) for (index, span), (following, _)
+                   in zip(origins, origins[1:] + [(None, None)])
+                   if index != following]
+    stats.after += sum(1 for stmt in res if isinstance(stmt, Command))
+    return stats
+
+if __name__ == '__main__':
+    from pietc import compile_source
+    program = compile_source(sys.argv[1])
+    stats = optimize(program)
+    print('commands: {} -> {} ({} sequences)'
+          .format(stats.before, stats.after, stats.sequences))
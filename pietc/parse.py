@@ -1,8 +1,43 @@
-import math
-import operator as op
-from functools import partial
-from ply.yacc import yacc
-from pietc.lex import tokens, lexer
+import sys
+from collections import namedtuple
+from ply.yacc import yacc, NullLogger
+from pietc.lex import tokens, get_lexer
+
+# the LALR tables are shipped as `pietc/parsetab.py`. Regenerate them with
+# `python -m pietc.parse` whenever the grammar below changes.
+TABMODULE = 'parsetab'
+
+_parser = None
+
+class Span (namedtuple('Span', 'line column end_line end_column')):
+    """
+    Where a form was read from: the line and column of its `(` and of its
+    `)`, counting from 1.
+    """
+    __slots__ = ()
+
+    def __str__ (self):
+        return '{}:{}'.format(self.line, self.column)
+
+class Form (list):
+    """
+    A list read from source, along with its Span.
+
+    Forms compare, hash and print exactly like lists, so the rest of the
+    compiler treats them as plain s-expressions. `evaluate` attributes the
+    commands that a form emits to its span (see `Sequence.origins`).
+
+    """
+    __slots__ = ('span',)
+
+    def __init__ (self, items=(), span=None):
+        super().__init__(items)
+        self.span = span
+
+def column (p, n):
+    """Return the column of the n-th symbol of a production."""
+    lexpos = p.lexpos(n)
+    return lexpos - p.lexer.lexdata.rfind('\n', 0, lexpos)
 
 def p_sexpression_list (p):
     '''sexpression_list : sexpression_list sexpression
@@ -21,9 +56,11 @@ def p_sexpression (p):
                    | QUOTE atom
                    | atom'''
     if len(p) == 5:
-        p[0] = ['quote', p[3]]
+        p[0] = ['quote', Form(p[3], Span(p.lineno(2), column(p, 2),
+                                         p.lineno(4), column(p, 4)))]
     elif len(p) == 4:
-        p[0] = p[2]
+        p[0] = Form(p[2], Span(p.lineno(1), column(p, 1),
+                               p.lineno(3), column(p, 3)))
     elif len(p) == 3:
         p[0] = ['quote', p[2]]
     else:
@@ -38,4 +75,88 @@ def p_atom (p):
             | NIL'''
     p[0] = p[1]
 
-parser = yacc()
+def build_parser (write_tables=False):
+    """Construct the parser from the shipped tables."""
+    return yacc(module=sys.modules[__name__], tabmodule=TABMODULE,
+                debug=False, write_tables=write_tables,
+                errorlog=NullLogger())
+
+def get_parser ():
+    """Return the parser, constructing it on first use."""
+    global _parser
+    if _parser is None:
+        get_lexer()
+        _parser = build_parser()
+    return _parser
+
+def iter_sexpressions (stream):
+    """
+    Yield the top-level s-expressions of `stream` as they are completed.
+
+    Parameters
+    ==========
+
+    stream : iterable of str
+        Any file-like object (or iterable) producing lines of source.
+
+    This produces the same forms as `get_parser().parse` but only holds the
+    form that is currently open, so a top-level expression is available as
+    soon as its closing paren has been read. No token spans more than one
+    line, so the source is lexed one line at a time. Every list is a Form
+    that knows its Span.
+
+    Examples
+    ========
+
+    >>> from io import StringIO
+    >>> from pietc.parse import iter_sexpressions
+    >>> list(iter_sexpressions(StringIO("(define x 5)\n'(1 2)")))
+    [['define', 'x', 5], ['quote', [1, 2]]]
+
+    """
+    lexer = get_lexer().clone()
+    # each open list is stored along with whether it was quoted and where
+    # it started.
+    opened = []
+    quoted = False
+    for lineno, line in enumerate(stream, 1):
+        lexer.lineno = lineno
+        lexer.input(line)
+        for tok in iter(lexer.token, None):
+            if tok.type == 'QUOTE':
+                if quoted:
+                    raise RuntimeError('parse error: unexpected quote on line %d'
+                                       % lineno)
+                quoted = True
+                continue
+            if tok.type == 'LPAREN':
+                opened.append((Form(), quoted, lineno, tok.lexpos + 1))
+                quoted = False
+                continue
+            if tok.type == 'RPAREN':
+                if not opened or quoted:
+                    raise RuntimeError('parse error: unexpected `)` on line %d'
+                                       % lineno)
+                sexpr, is_quoted, line, start = opened.pop()
+                sexpr.span = Span(line, start, lineno, tok.lexpos + 1)
+            else:
+                sexpr, is_quoted = tok.value, quoted
+                quoted = False
+            if is_quoted:
+                sexpr = ['quote', sexpr]
+            if opened:
+                opened[-1][0].append(sexpr)
+            else:
+                yield sexpr
+    if opened or quoted:
+        raise RuntimeError('parse error: unexpected end of input')
+
+def __getattr__ (name):
+    # `parser` is constructed lazily so that importing this module is cheap.
+    if name == 'parser':
+        return get_parser()
+    raise AttributeError('module {!r} has no attribute {!r}'
+                         .format(__name__, name))
+
+if __name__ == '__main__':
+    build_parser(write_tables=True)
@@ -1,7 +1,8 @@
-import numpy as np
-from collections import deque
-from pietc.eval import Sequence, LambdaSequence, Parameter, Conditional, Atom
-from pietc.debug import debuginfo
+import operator as op
+from functools import reduce
+from pietc.eval import Sequence, LambdaSequence, Parameter, Conditional, Atom, \
+    DeferredSequence, stack_frame
+from pietc import trace
 
 COMMAND_DIFFERENTIALS = {
     'push' : (0,1),
@@ -24,38 +25,75 @@ COMMAND_DIFFERENTIALS = {
 }
 
 class Command (object):
-    def __init__ (self, name):
-        self.name = name
-        self.has_args = False
+    """
+    A piet command without arguments.
+
+    Commands are immutable and interned, so `Command('pop')` always returns
+    the same object and `shift` is the shared tuple from
+    COMMAND_DIFFERENTIALS.
+
+    """
+    __slots__ = ('name', 'shift')
+    has_args = False
+    _interned = {}
+
+    def __new__ (cls, name):
         try:
-            self.shift = np.asarray(COMMAND_DIFFERENTIALS[self.name])
+            return cls._interned[name]
         except KeyError:
-            raise RuntimeError('invalid command: %s' % self.name)
+            raise RuntimeError('invalid command: %s' % name)
+
+    @classmethod
+    def _create (cls, name):
+        self = object.__new__(cls)
+        object.__setattr__(self, 'name', name)
+        object.__setattr__(self, 'shift', COMMAND_DIFFERENTIALS[name])
+        return self
+
+    def __setattr__ (self, attr, value):
+        raise AttributeError('commands are immutable')
+
+    def __reduce__ (self):
+        return (Command, (self.name,))
 
     def __repr__ (self):
         return '{}({})'.format(self.__class__.__name__, self.name)
 
+Command._interned.update((name, Command._create(name))
+                         for name in COMMAND_DIFFERENTIALS if name != 'push')
+
 class Push (Command):
-    def __init__ (self, value):
-        super().__init__(name='push')
-        self.value = value
+    __slots__ = ('value',)
+
+    def __new__ (cls, value):
+        self = cls._create('push')
+        object.__setattr__(self, 'value', value)
+        return self
+
+    def __reduce__ (self):
+        return (Push, (self.value,))
 
     def __repr__ (self):
         return '{}({})'.format(self.__class__.__name__, self.value)
 
 def notify_stack_change (seq, stack_delta):
-    if isinstance(seq, LambdaSequence):
+    seq = stack_frame(seq)
+    if seq is not None:
         seq.stack_offset += stack_delta
-        debuginfo('{} ({} -> {})',
-                  seq, seq.stack_offset - stack_delta,
-                  seq.stack_offset,
-                  prefix='broadcast')
+        if trace.enabled('stack'):
+            trace.emit('stack', sequence=seq, offset=seq.stack_offset,
+                       delta=stack_delta)
 
 def condition_op (seq, *args):
     test_sexpr, if_sexpr, else_sexpr = args if len(args) == 3 else (*args, None)
-    cond = Conditional(if_sexpr, else_sexpr, seq.env)
-    test_seq = Sequence(test_sexpr, seq.env)
+    # the test and the branch both run where the conditional is.
+    lamda_seq = stack_frame(seq)
+    frame = None if lamda_seq is None else (lamda_seq, lamda_seq.stack_offset)
+    cond = Conditional(if_sexpr, else_sexpr, seq.env, frame)
+    test_seq = DeferredSequence(test_sexpr, seq.env, frame)
     seq.extend([test_seq, cond])
+    # the branch that is taken leaves its value.
+    notify_stack_change(seq, 1)
     return cond
 
 def push_op (seq, *args):
@@ -65,18 +103,33 @@ def push_op (seq, *args):
             seq.append(Push(arg))
             notify_stack_change(seq, 1)
         elif isinstance(arg, Parameter):
-            # depth = param depth + stack depth
-            depth = arg.param_depth
-            if depth != 0:
-                push_op(seq, depth, -1)
-                roll_op(seq)
-                # param depth -= 1, stack depth += 1
-            duplicate_op(seq)
-            # stack depth += 1
-            if depth != 0:
-                push_op(seq, depth + 1, 1)
-                roll_op(seq)
-                # param depth += 1, stack depth -= 1
+            lamda_seq = arg.lamda_seq
+            read_op(seq, lamda_seq, arg, lamda_seq.last_read(arg))
+
+def read_op (seq, lamda_seq, key, last=False):
+    """
+    Push a copy of a slot of `lamda_seq` (a parameter or a common
+    subexpression), or move the slot itself if this is its `last` read.
+    """
+    # depth = param depth + stack depth
+    depth = lamda_seq.param_depth(key)
+    if last and seq is lamda_seq:
+        if depth != 0:
+            push_op(seq, depth, -1)
+            roll_op(seq)
+        lamda_seq.release(key)
+        notify_stack_change(seq, 1)
+        return
+    if depth != 0:
+        push_op(seq, depth, -1)
+        roll_op(seq)
+        # param depth -= 1, stack depth += 1
+    duplicate_op(seq)
+    # stack depth += 1
+    if depth != 0:
+        push_op(seq, depth + 1, 1)
+        roll_op(seq)
+        # param depth += 1, stack depth -= 1
 
 def pop_op (seq, *args):
     seq.append(Command('pop'))
@@ -146,3 +199,59 @@ def or_op (seq, *args):
 
 def and_op (seq, *args):
     multiply_op(seq, *args)
+
+def fold_chain (func):
+    """Fold arguments the way a chain of binary commands evaluates them."""
+    def fold (*args):
+        if not args:
+            return None
+        return reduce(lambda x, y: func(y, x), reversed(args))
+    return fold
+
+def fold_binary (func):
+    """Fold operators that only emit a single command for two arguments."""
+    def fold (*args):
+        return func(*args) if len(args) == 2 else None
+    return fold
+
+def fold_unary (func):
+    def fold (*args):
+        return func(*args) if len(args) == 1 else None
+    return fold
+
+# commands emitted by each application of a pure operator (per extra
+# argument for the operators that chain).
+OPERATOR_COMMANDS = {
+    add_op : 1,
+    subtract_op : 1,
+    multiply_op : 1,
+    divide_op : 1,
+    modulo_op : 1,
+    greater_op : 1,
+    less_op : 4,
+    greater_or_equal_op : 5,
+    less_or_equal_op : 2,
+    equal_op : 2,
+    not_equal_op : 1,
+    not_op : 1,
+    or_op : 1,
+    and_op : 1,
+}
+
+# compile-time equivalents of the pure operators, matching the emitted code.
+FOLDING = {
+    add_op : fold_chain(op.add),
+    subtract_op : fold_chain(op.sub),
+    multiply_op : fold_chain(op.mul),
+    divide_op : fold_chain(op.floordiv),
+    modulo_op : fold_binary(op.mod),
+    greater_op : fold_binary(lambda y, x: int(y > x)),
+    less_op : fold_binary(lambda y, x: int(y < x)),
+    greater_or_equal_op : fold_binary(lambda y, x: int(y >= x)),
+    less_or_equal_op : fold_binary(lambda y, x: int(y <= x)),
+    equal_op : fold_binary(lambda y, x: int(not (y - x))),
+    not_equal_op : fold_binary(op.sub),
+    not_op : fold_unary(lambda x: int(not x)),
+    or_op : fold_chain(op.add),
+    and_op : fold_chain(op.mul),
+}
@@ -0,0 +1,157 @@
+import sys
+import argparse
+from pietc.ir import CALL, BRANCH, JUMPZ
+
+class Profile (object):
+    """
+    Where the steps of a simulation were spent.
+
+    A `pietc.sim.Simulator` created with `profile=True` reports every
+    instruction it executes to `step`, along with its call frames. Each
+    distinct call stack (the pc of every call in progress, and of the
+    instruction itself) is counted once in `samples` with the steps spent
+    there and the highest stack seen when one of them started.
+
+    Steps are attributed to the source form that emitted each instruction
+    (see `pietc.ir.Bytecode.origins`) and to the subroutine it belongs to.
+    Own steps are spent in a form or subroutine itself, while total steps
+    also include everything that it called.
+
+    Examples
+    ========
+
+    >>> from pietc.sim import Simulator
+    >>> sim = Simulator(program, profile=True)
+    >>> sim.run()
+    >>> print(sim.profile.report())
+    >>> sim.profile.write_collapsed('program.folded')
+
+    """
+    def __init__ (self, ir):
+        self.ir = ir
+        self.samples = {}
+
+    def step (self, op, frames, pc, height):
+        """Count the instruction at `pc` if it is a step of the program."""
+        # calls, returns and jumps are only moves through the image, but a
+        # branch pops its condition the first time it is taken.
+        if op >= CALL and op != JUMPZ and (
+                op != BRANCH
+                or self.ir.branches[self.ir.args[pc]].has_choice):
+            return
+        key = (tuple(frames), pc)
+        sample = self.samples.get(key)
+        if sample is None:
+            self.samples[key] = [1, height]
+        else:
+            sample[0] += 1
+            if height > sample[1]:
+                sample[1] = height
+
+    @property
+    def steps (self):
+        return sum(steps for steps, _ in self.samples.values())
+
+    def stacks (self):
+        """
+        Yield every sampled call stack as a list of `(subroutine, pc)`
+        pairs from the root, along with its steps and highest stack.
+        """
+        ir = self.ir
+        for (frames, pc), (steps, height) in self.samples.items():
+            stack = []
+            number = ir.root
+            for callee, ret in frames:
+                stack.append((number, ret - 1))
+                number = callee
+            stack.append((number, pc))
+            yield stack, steps, height
+
+    def aggregate (self, key):
+        """
+        Return `{name: [own steps, total steps, highest stack]}` keyed by
+        `key(subroutine, pc)` for every frame of every sampled call stack.
+        """
+        res = {}
+        for stack, steps, height in self.stacks():
+            names = [key(number, pc) for number, pc in stack]
+            for name in set(names):
+                entry = res.setdefault(name, [0, 0, 0])
+                entry[1] += steps
+                entry[2] = max(entry[2], height)
+            res[names[-1]][0] += steps
+        return res
+
+    def forms (self):
+        """The steps spent in every source form, keyed by its Span."""
+        return self.aggregate(lambda number, pc: self.ir.origin(pc))
+
+    def subroutines (self):
+        """The steps spent in every subroutine, keyed by its name."""
+        return self.aggregate(lambda number, pc: self.ir.name(number))
+
+    def frame (self, number, pc):
+        """Return the label of a frame in a collapsed stack."""
+        span = self.ir.origin(pc)
+        name = self.ir.name(number)
+        return name if span is None else '{} {}'.format(name, span)
+
+    def collapsed (self):
+        """
+        Return the steps of every call stack in the collapsed format of
+        flamegraph.pl and similar tools: frames from the root separated by
+        `;`, a space and the count.
+        """
+        res = {}
+        for stack, steps, _ in self.stacks():
+            line = ';'.join(self.frame(number, pc) for number, pc in stack)
+            res[line] = res.get(line, 0) + steps
+        return ['{} {}'.format(line, steps)
+                for line, steps in sorted(res.items())]
+
+    def write_collapsed (self, path):
+        with open(path, 'w') as File:
+            for line in self.collapsed():
+                File.write(line + '\n')
+
+    def report (self, limit=20):
+        """Return tables of the busiest subroutines and forms."""
+        lines = []
+        for title, entries in (('subroutine', self.subroutines()),
+                               ('form', self.forms())):
+            lines.append('{:<24} {:>10} {:>10} {:>8}'.format(
+                title, 'own', 'total', 'stack'))
+            ranked = sorted(entries.items(), key=lambda item: -item[1][1])
+            for name, (own, total, height) in ranked[:limit]:
+                name = 'unknown' if name is None else str(name)
+                lines.append('{:<24} {:>10} {:>10} {:>8}'.format(
+                    name, own, total, height))
+            lines.append('')
+        lines.append('{} steps'.format(self.steps))
+        return '\n'.join(lines)
+
+    def __repr__ (self):
+        return '{}({} steps, {} stacks)'.format(
+            self.__class__.__name__, self.steps, len(self.samples))
+
+def main (argv=None):
+    from pietc import compile_source
+    from pietc.sim import Simulator
+    parser = argparse.ArgumentParser(
+        prog='python -m pietc.profiler',
+        description='Simulate a program and report where its steps go.')
+    parser.add_argument('source')
+    parser.add_argument('-o', '--collapsed', metavar='PATH',
+                        help='write the call stacks for a flame graph')
+    parser.add_argument('-n', '--limit', type=int, default=20,
+                        help='rows of each table')
+    args = parser.parse_args(argv)
+    program = compile_source(args.source)
+    sim = Simulator(program, profile=True)
+    sim.run()
+    print(sim.profile.report(args.limit))
+    if args.collapsed:
+        sim.profile.write_collapsed(args.collapsed)
+
+if __name__ == '__main__':
+    sys.exit(main())
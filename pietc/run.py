@@ -0,0 +1,379 @@
+import sys
+import numpy as np
+from PIL import Image
+from pietc.piet import COMMAND_DIFFERENTIALS
+from pietc.image import COLORVALS, COLORSHAPE, BLACK, WHITE
+
+# codel colors are stored as `hue * 3 + lightness` for the 18 piet colors.
+WHITE_IDX = 18
+BLACK_IDX = 19
+
+# direction pointer: right, down, left, up.
+DP_ROW = (0, 1, 0, -1)
+DP_COL = (1, 0, -1, 0)
+
+NOOP, PUSH, POP, ADD, SUBTRACT, MULTIPLY, DIVIDE, MODULO, NOT, GREATER, \
+    POINTER, SWITCH, DUPLICATE, ROLL, IN_INT, IN, OUT_INT, OUT = range(18)
+
+OPCODES = {
+    'push' : PUSH,
+    'pop' : POP,
+    'add' : ADD,
+    'subtract' : SUBTRACT,
+    'multiply' : MULTIPLY,
+    'divide' : DIVIDE,
+    'mod' : MODULO,
+    'not' : NOT,
+    'greater' : GREATER,
+    'pointer' : POINTER,
+    'switch' : SWITCH,
+    'duplicate' : DUPLICATE,
+    'roll' : ROLL,
+    'in_int' : IN_INT,
+    'in' : IN,
+    'out_int' : OUT_INT,
+    'out' : OUT,
+}
+
+# indexed by `hue change * 3 + lightness change`.
+COMMAND_TABLE = [NOOP] * 18
+for name, (hue, light) in COMMAND_DIFFERENTIALS.items():
+    COMMAND_TABLE[hue * 3 + light] = OPCODES[name]
+
+def pack_rgb (pixels):
+    pixels = np.asarray(pixels, dtype=np.int64)
+    return (pixels[..., 0] << 16) | (pixels[..., 1] << 8) | pixels[..., 2]
+
+COLORCODES = dict(zip(pack_rgb(np.array(COLORVALS.flatten().tolist())).tolist(),
+                      range(np.prod(COLORSHAPE))))
+COLORCODES[int(pack_rgb(WHITE))] = WHITE_IDX
+COLORCODES[int(pack_rgb(BLACK))] = BLACK_IDX
+
+def detect_codel_size (pixels):
+    """Return the largest codel size consistent with the runs of `pixels`."""
+    packed = pack_rgb(pixels)
+    height, width = packed.shape
+    cols = np.nonzero((packed[:, 1:] != packed[:, :-1]).any(axis=0))[0] + 1
+    rows = np.nonzero((packed[1:] != packed[:-1]).any(axis=1))[0] + 1
+    return int(np.gcd.reduce(np.concatenate(([height, width], rows, cols))))
+
+def roll (stack):
+    """Execute a piet `roll`, ignoring it if the depth is out of range."""
+    count, depth = stack[-1], stack[-2]
+    if 0 <= depth <= len(stack) - 2:
+        del stack[-2:]
+        if depth:
+            count %= depth
+            split = len(stack) - count
+            stack[-depth:] = stack[split:] + stack[-depth:split]
+
+class PietImage (object):
+    """
+    A Piet program decoded into codels and color blocks.
+
+    Parameters
+    ==========
+
+    pixels : array_like
+        An `(H, W, 3)` array of RGB values.
+    codel_size : int
+        Side length of a codel in pixels. Detected from the image when not
+        given.
+
+    Colors outside of the piet palette are treated as white. Every color
+    block is labelled once, and its exit codel for each of the eight DP/CC
+    combinations is stored in `exits`. Complete transitions between blocks
+    (including white slides and retries) are memoized in `moves` the first
+    time they are taken, so that execution never searches the image again.
+
+    """
+    def __init__ (self, pixels, codel_size=None):
+        pixels = np.asarray(pixels)[..., :3]
+        if codel_size is None:
+            codel_size = detect_codel_size(pixels)
+        self.codel_size = codel_size
+        packed = pack_rgb(pixels[::codel_size, ::codel_size])
+        self.colors = np.full(packed.shape, WHITE_IDX, dtype=np.int8)
+        for code, idx in COLORCODES.items():
+            self.colors[packed == code] = idx
+        self.shape = self.colors.shape
+        self._label_blocks()
+        self._find_exits()
+        self.moves = {}
+
+    @classmethod
+    def open (cls, path, codel_size=None):
+        with Image.open(path) as img:
+            pixels = np.asarray(img.convert('RGB'))
+        return cls(pixels, codel_size)
+
+    def _label_blocks (self):
+        colors = self.colors
+        height, width = self.shape
+        labels = np.full(self.shape, -1, dtype=np.int32)
+        block_color = []
+        flat_colors = colors.ravel().tolist()
+        flat_labels = [-1] * len(flat_colors)
+        for start, color in enumerate(flat_colors):
+            if color >= WHITE_IDX or flat_labels[start] != -1:
+                continue
+            label = len(block_color)
+            block_color.append(color)
+            flat_labels[start] = label
+            pending = [start]
+            while pending:
+                idx = pending.pop()
+                row, col = divmod(idx, width)
+                neighbours = []
+                if col > 0:
+                    neighbours.append(idx - 1)
+                if col < width - 1:
+                    neighbours.append(idx + 1)
+                if row > 0:
+                    neighbours.append(idx - width)
+                if row < height - 1:
+                    neighbours.append(idx + width)
+                for other in neighbours:
+                    if flat_labels[other] == -1 and flat_colors[other] == color:
+                        flat_labels[other] = label
+                        pending.append(other)
+        labels.ravel()[:] = flat_labels
+        self.labels = labels
+        self.block_color = np.array(block_color, dtype=np.int8)
+        self.block_size = np.bincount(labels[labels >= 0],
+                                      minlength=len(block_color))
+
+    def _find_exits (self):
+        """Store the exit codel of every block for each DP and CC."""
+        count = len(self.block_color)
+        self.exits = np.zeros((count, 4, 2, 2), dtype=np.int32)
+        flat = self.labels.ravel()
+        order = np.argsort(flat, kind='stable')
+        bounds = np.searchsorted(flat[order], np.arange(count + 1))
+        rows, cols = np.divmod(order, self.shape[1])
+        for label in range(count):
+            r = rows[bounds[label]:bounds[label+1]]
+            c = cols[bounds[label]:bounds[label+1]]
+            for dp, (edge, across, sign) in enumerate(((c, r, 1), (r, c, 1),
+                                                       (c, r, -1), (r, c, -1))):
+                on_edge = edge == (edge.max() if sign > 0 else edge.min())
+                candidates = across[on_edge]
+                # CC left is counterclockwise from the DP, CC right clockwise.
+                lo, hi = candidates.min(), candidates.max()
+                left, right = (lo, hi) if dp in (0, 3) else (hi, lo)
+                edge_val = edge[on_edge][0]
+                for cc, val in enumerate((left, right)):
+                    if dp % 2 == 0:
+                        self.exits[label, dp, cc] = (val, edge_val)
+                    else:
+                        self.exits[label, dp, cc] = (edge_val, val)
+
+    def codel (self, row, col):
+        """Return the color index at a codel, or black when out of bounds."""
+        if 0 <= row < self.shape[0] and 0 <= col < self.shape[1]:
+            return self.colors[row, col]
+        return BLACK_IDX
+
+    def slide (self, row, col, dp, cc):
+        """
+        Slide through white codels starting at `(row, col)`.
+
+        Returns `(block, dp, cc)` for the colored block that is reached, or
+        `None` if the slide retraces itself.
+
+        """
+        seen = set()
+        while (row, col, dp, cc) not in seen:
+            seen.add((row, col, dp, cc))
+            while True:
+                nrow, ncol = row + DP_ROW[dp], col + DP_COL[dp]
+                color = self.codel(nrow, ncol)
+                if color == BLACK_IDX:
+                    break
+                if color != WHITE_IDX:
+                    return int(self.labels[nrow, ncol]), dp, cc
+                row, col = nrow, ncol
+            cc ^= 1
+            dp = (dp + 1) % 4
+        return None
+
+    def move (self, block, dp, cc):
+        """
+        Return the transition out of `block` for the given DP and CC.
+
+        The result is `(block, dp, cc, opcode)` or `None` when the program
+        terminates.
+
+        """
+        key = (block, dp, cc)
+        if key in self.moves:
+            return self.moves[key]
+        res = None
+        for attempt in range(8):
+            row, col = self.exits[block, dp, cc]
+            row, col = row + DP_ROW[dp], col + DP_COL[dp]
+            color = self.codel(row, col)
+            if color == WHITE_IDX:
+                res = self.slide(row, col, dp, cc)
+                if res is not None:
+                    res = res + (NOOP,)
+                break
+            if color != BLACK_IDX:
+                src = self.block_color[block]
+                hue = (color // 3 - src // 3) % 6
+                light = (color % 3 - src % 3) % 3
+                res = (int(self.labels[row, col]), dp, cc,
+                       COMMAND_TABLE[hue * 3 + light])
+                break
+            if attempt % 2 == 0:
+                cc ^= 1
+            else:
+                dp = (dp + 1) % 4
+        self.moves[key] = res
+        return res
+
+    def start (self):
+        """Return the initial `(block, dp, cc)` or `None`."""
+        color = self.codel(0, 0)
+        if color == BLACK_IDX:
+            return None
+        if color == WHITE_IDX:
+            return self.slide(0, 0, 0, 0)
+        return int(self.labels[0, 0]), 0, 0
+
+class Interpreter (object):
+    """
+    Execute a PietImage.
+
+    Parameters
+    ==========
+
+    image : PietImage, str
+        The program, or a path to a PNG to be loaded.
+    stdin : str
+        Input consumed by the `in` and `in_int` commands.
+    max_steps : int
+        Stop after executing this many block transitions.
+
+    Commands that would underflow the stack, divide by zero or read past
+    the end of the input are ignored, as the spec suggests.
+
+    Examples
+    ========
+
+    >>> from pietc.run import Interpreter
+    >>> Interpreter('test/fizzbuzz.png').run()[:8]
+    '1\\n2\\nFizz'
+
+    """
+    def __init__ (self, image, stdin='', max_steps=None):
+        if not isinstance(image, PietImage):
+            image = PietImage.open(image)
+        self.image = image
+        self.stdin = stdin
+        self.max_steps = max_steps
+        self.input_pos = 0
+        self.stack = []
+        self.output = []
+        self.steps = 0
+
+    def read_int (self):
+        text = self.stdin
+        pos = self.input_pos
+        while pos < len(text) and text[pos].isspace():
+            pos += 1
+        end = pos + 1 if pos < len(text) and text[pos] in '+-' else pos
+        while end < len(text) and text[end].isdigit():
+            end += 1
+        try:
+            value = int(text[pos:end])
+        except ValueError:
+            return None
+        self.input_pos = end
+        return value
+
+    def read_char (self):
+        if self.input_pos >= len(self.stdin):
+            return None
+        self.input_pos += 1
+        return ord(self.stdin[self.input_pos - 1])
+
+    def run (self):
+        """Execute the image and return everything it printed."""
+        image = self.image
+        moves = image.moves
+        block_size = image.block_size
+        stack = self.stack
+        output = self.output
+        max_steps = self.max_steps
+        state = image.start()
+        steps = self.steps
+        while state is not None:
+            if max_steps is not None and steps >= max_steps:
+                break
+            block, dp, cc = state
+            res = moves.get(state)
+            if res is None:
+                res = image.move(block, dp, cc)
+                if res is None:
+                    break
+            steps += 1
+            nblock, dp, cc, op = res
+            if op == NOOP:
+                pass
+            elif op == PUSH:
+                stack.append(int(block_size[block]))
+            elif op == IN_INT or op == IN:
+                value = self.read_int() if op == IN_INT else self.read_char()
+                if value is not None:
+                    stack.append(value)
+            elif not stack:
+                pass
+            elif op == POP:
+                stack.pop()
+            elif op == NOT:
+                stack[-1] = int(not stack[-1])
+            elif op == DUPLICATE:
+                stack.append(stack[-1])
+            elif op == POINTER:
+                dp = (dp + stack.pop()) % 4
+            elif op == SWITCH:
+                cc = (cc + stack.pop()) % 2
+            elif op == OUT_INT:
+                output.append(str(stack.pop()))
+            elif op == OUT:
+                output.append(chr(stack.pop()))
+            elif len(stack) < 2:
+                pass
+            elif op == ROLL:
+                roll(stack)
+            else:
+                x = stack[-1]
+                if op in (DIVIDE, MODULO) and x == 0:
+                    pass
+                else:
+                    stack.pop()
+                    y = stack[-1]
+                    if op == ADD:
+                        stack[-1] = y + x
+                    elif op == SUBTRACT:
+                        stack[-1] = y - x
+                    elif op == MULTIPLY:
+                        stack[-1] = y * x
+                    elif op == DIVIDE:
+                        stack[-1] = y // x
+                    elif op == MODULO:
+                        stack[-1] = y % x
+                    elif op == GREATER:
+                        stack[-1] = int(y > x)
+            state = (nblock, dp, cc)
+        self.steps = steps
+        return ''.join(output)
+
+def run (path, stdin='', max_steps=None):
+    """Load the PNG at `path`, execute it and return its output."""
+    return Interpreter(path, stdin, max_steps).run()
+
+if __name__ == '__main__':
+    sys.stdout.write(run(sys.argv[1], sys.stdin.read() if len(sys.argv) < 3
+                                      else sys.argv[2]))
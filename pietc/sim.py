@@ -1,97 +1,113 @@
+import sys
 from functools import wraps
-from collections import deque
-from pietc import Program
-from pietc.parse import parser
-from pietc.eval import Sequence, MacroSequence, Conditional, evaluate
+from pietc import compile_source
+from pietc.eval import Sequence, MacroSequence, Conditional, Label, Jump
 from pietc.piet import Command, Push
-from pietc.debug import debuginfo
+from pietc import trace
+from pietc.ir import Bytecode, PUSH, POP, ROLL, DUPLICATE, ADD, SUBTRACT, \
+    MULTIPLY, DIVIDE, MODULO, GREATER, NOT, BRANCH, RETURN, JUMP, JUMPZ, \
+    OPNAMES
+from pietc.profiler import Profile
 
-stack = deque()
+stack = []
 
-def printout (func):
-    def wraps (*args, **kwargs):
-        res = func(*args, **kwargs)
-        print('{}: {}'.format(func.__name__, list(stack)))
+def traced (func):
+    """Emit a 'simulate' event with the stack after every call of `func`."""
+    command = func.__name__[:-len('_sim')]
+    @wraps(func)
+    def wrapper (*args):
+        res = func(*args)
+        if trace.enabled('simulate'):
+            trace.emit('simulate', command=command, stack=list(stack))
         return res
-    return wraps
+    return wrapper
 
 def get_condition (cond):
     res = cond.choice if cond.has_choice else condition_sim(cond)
-    if not isinstance(cond, MacroSequence):
-        print('jump: {} -> {}'.format(cond, res))
+    if trace.enabled('simulate') and not isinstance(cond, MacroSequence):
+        trace.emit('simulate', conditional=cond, choice=res)
     return res
 
 def jump_sim (seq):
     seq.expand()
     if len(seq) != 0:
-        if isinstance(seq, MacroSequence):
-            print('jump: {}'.format(seq))
         simulate(list(seq))
-        if isinstance(seq, MacroSequence):
-            print('return: {}'.format(seq))
+        if trace.enabled('simulate') and isinstance(seq, MacroSequence):
+            trace.emit('simulate', returned=seq)
 
-@printout
+@traced
 def condition_sim (cond):
     cond.choice = stack.pop()
     return cond if isinstance(cond, MacroSequence) else cond.choice
 
-@printout
+@traced
 def pop_sim ():
     res = stack.pop()
     return res
 
-@printout
+@traced
 def push_sim (value):
     stack.append(value)
 
-@printout
+def roll_stack (stack, depth, count):
+    """
+    Roll the top `depth + 1` elements of `stack` by `count` in place.
+
+    A positive count buries the top element, a negative count raises the
+    deepest one. Only the rolled elements are moved, so the cost depends on
+    `depth` and not on the height of the stack.
+
+    """
+    if len(stack) - depth - 1 < 0:
+        raise RuntimeWarning('call to roll ignored')
+    if depth < 0:
+        return
+    count %= depth + 1
+    if count:
+        split = len(stack) - count
+        stack[-depth-1:] = stack[split:] + stack[-depth-1:split]
+
+@traced
 def roll_sim ():
-    global stack
     count = stack.pop()
     depth = stack.pop()
-    split = len(stack) - depth - 1
-    if split < 0:
-        raise RuntimeWarning('call to roll ignored')
-    front = list(stack)[:split]
-    back = deque(stack, maxlen=depth+1)
-    back.rotate(count)
-    stack = deque(front + list(back))
+    roll_stack(stack, depth, count)
 
-@printout
+@traced
 def duplicate_sim ():
     stack.append(stack[-1])
 
-@printout
+@traced
 def add_sim ():
     x, y = stack.pop(), stack.pop()
     stack.append(y + x)
 
-@printout
+@traced
 def subtract_sim ():
     x, y = stack.pop(), stack.pop()
     stack.append(y - x)
 
-@printout
+@traced
 def multiply_sim ():
     x, y = stack.pop(), stack.pop()
     stack.append(y * x)
 
-@printout
+@traced
 def divide_sim ():
     x, y = stack.pop(), stack.pop()
     stack.append(y // x)
 
-@printout
+@traced
 def modulo_sim ():
     x, y = stack.pop(), stack.pop()
     stack.append(y % x)
 
-@printout
+@traced
 def greater_sim ():
     x, y = stack.pop(), stack.pop()
     stack.append(int(y > x))
 
-@printout
+@traced
 def not_sim ():
     x = stack.pop()
     stack.append(int(not x))
@@ -110,8 +126,18 @@ LOOKUPSIM = {
 }
 
 def simulate (seq):
-    debuginfo('{}', seq, prefix='simulating')
-    for stmt in seq:
+    if trace.enabled('simulate'):
+        trace.emit('simulate', sequence=seq)
+    labels = dict((id(stmt), i) for i, stmt in enumerate(seq)
+                  if isinstance(stmt, Label))
+    i = 0
+    while i < len(seq):
+        stmt = seq[i]
+        i += 1
+        if isinstance(stmt, Jump):
+            if not stmt.conditional or not pop_sim():
+                i = labels[id(stmt.label)]
+            continue
         if isinstance(stmt, Conditional):
             stmt = get_condition(stmt)
         if isinstance(stmt, Push):
@@ -121,11 +147,144 @@ def simulate (seq):
         elif isinstance(stmt, Sequence):
             jump_sim(stmt)
 
+class Simulator (object):
+    """
+    Execute an expanded Program over its flat Bytecode.
+
+    Parameters
+    ==========
+
+    program : Sequence
+        The Program (or any Sequence) to be simulated.
+    trace : bool
+        Print the stack after every instruction, as `simulate` does.
+    out : file
+        Stream that receives the trace. Defaults to `sys.stdout`.
+    profile : bool
+        Record where every step is spent in a `pietc.profiler.Profile`,
+        available as `profile` once the program has run.
+    rules : list
+        Peephole rules to lower the program with (see `pietc.ir.Bytecode`).
+
+    The program is lowered once into a `pietc.ir.Bytecode`, and the run loop
+    then only indexes its arrays. Branches are lowered as they are taken.
+
+    The stack, the call frames and the bytecode all belong to the instance,
+    so separate simulators do not interfere with each other.
+
+    Examples
+    ========
+
+    >>> from pietc.sim import Simulator
+    >>> Simulator(program).run()
+    [20]
+
+    """
+    def __init__ (self, program, trace=False, out=None, profile=False,
+                  rules=None):
+        self.program = program
+        self.trace = trace
+        self.out = out if out is not None else sys.stdout
+        self.stack = []
+        self.steps = 0
+        self.ir = Bytecode(program, rules)
+        self.profile = Profile(self.ir) if profile else None
+
+    def branch (self, index):
+        """Resolve a BRANCH and return the subroutine index of its target."""
+        cond = self.ir.branches[index]
+        value = None
+        if not cond.has_choice:
+            value = self.stack.pop()
+            self.steps += 1
+        target = self.ir.resolve(index, value)
+        if self.trace and not isinstance(cond, MacroSequence):
+            print('jump: {} -> {}'.format(cond, cond.choice), file=self.out)
+        return target
+
+    def run (self):
+        """Simulate the program and return the resulting stack."""
+        stack = self.stack
+        ir = self.ir
+        ops, args, constants, starts = ir.ops, ir.args, ir.constants, ir.starts
+        trace = self.trace
+        out = self.out
+        profile = self.profile
+        # the subroutine and return address of every call in progress.
+        frames = []
+        pc = starts[ir.root]
+        steps = 0
+        while True:
+            op = ops[pc]
+            if profile is not None:
+                profile.step(op, frames, pc, len(stack))
+            pc += 1
+            steps += 1
+            if op == PUSH:
+                stack.append(constants[args[pc-1]])
+            elif op == DUPLICATE:
+                stack.append(stack[-1])
+            elif op == ROLL:
+                count = stack.pop()
+                roll_stack(stack, stack.pop(), count)
+            elif op == POP:
+                stack.pop()
+            elif op == ADD:
+                x = stack.pop()
+                stack[-1] += x
+            elif op == SUBTRACT:
+                x = stack.pop()
+                stack[-1] -= x
+            elif op == MULTIPLY:
+                x = stack.pop()
+                stack[-1] *= x
+            elif op == DIVIDE:
+                x = stack.pop()
+                stack[-1] //= x
+            elif op == MODULO:
+                x = stack.pop()
+                stack[-1] %= x
+            elif op == GREATER:
+                x = stack.pop()
+                stack[-1] = int(stack[-1] > x)
+            elif op == NOT:
+                stack[-1] = int(not stack[-1])
+            elif op == JUMPZ:
+                if not stack.pop():
+                    pc = args[pc-1]
+            else:
+                steps -= 1
+                if op == JUMP:
+                    pc = args[pc-1]
+                    continue
+                if op == RETURN:
+                    if not frames:
+                        break
+                    callee, pc = frames.pop()
+                    seq = ir.sequences[callee]
+                    if trace and isinstance(seq, MacroSequence):
+                        print('return: {}'.format(seq), file=out)
+                    continue
+                callee = args[pc-1]
+                if op == BRANCH:
+                    self.steps = steps
+                    callee = self.branch(callee)
+                    steps = self.steps
+                    if callee is None:
+                        continue
+                if ops[starts[callee]] == RETURN:
+                    continue
+                seq = ir.sequences[callee]
+                if trace and isinstance(seq, MacroSequence):
+                    print('jump: {}'.format(seq), file=out)
+                frames.append((callee, pc))
+                pc = starts[callee]
+                continue
+            if trace:
+                print('{}: {}'.format(OPNAMES[op], stack), file=out)
+        self.steps = steps
+        return stack
+
 if __name__ == '__main__':
-    with open('test.pl') as File:
-        code = parser.parse(File.read())
-    program = Program()
-    global_env = program.env
-    for sexpr in code:
-        evaluate(sexpr, global_env, program)
-    simulate(program)
+    program = compile_source(sys.argv[1] if len(sys.argv) > 1 else 'test.pl')
+    Simulator(program, trace=True).run()
@@ -0,0 +1,172 @@
+from pietc.eval import LambdaSequence
+from pietc.ir import Bytecode, PUSH, ROLL, DUPLICATE, CALL, BRANCH, RETURN, \
+    JUMP, JUMPZ
+from pietc.image import CODELLEN, attributed_commands
+
+# every command is drawn as a row of the image, as wide as the widest push
+# plus the codels that block the first and last blocks (see `render`).
+ROWWIDTH = CODELLEN + 2
+
+CONTROL = (CALL, BRANCH, RETURN, JUMP, JUMPZ)
+
+class DefinitionStats (object):
+    """
+    What a definition contributes to a Program.
+
+    commands
+        commands in its expansions, each expansion counted once.
+    pushes
+        how many of those commands are pushes.
+    access
+        commands that move values around the stack rather than compute
+        them: rolls, the two pushes of their operands and duplicates. Most
+        of them read lambda parameters.
+    expansions
+        subroutines it was expanded into (several for a lambda that is
+        called with different kinds of arguments).
+    rows
+        rows of the image it is drawn into. Subroutines are inlined
+        wherever they are called, so a definition pays for each call.
+
+    """
+    def __init__ (self, name):
+        self.name = name
+        self.commands = 0
+        self.pushes = 0
+        self.access = 0
+        self.expansions = 0
+        self.rows = 0
+
+    @property
+    def codels (self):
+        return self.rows * ROWWIDTH
+
+    def pixels (self, codel_size=1):
+        return self.codels * codel_size ** 2
+
+    def as_dict (self, codel_size=1):
+        return dict(name=self.name, commands=self.commands,
+                    pushes=self.pushes, access=self.access,
+                    expansions=self.expansions, rows=self.rows,
+                    codels=self.codels, pixels=self.pixels(codel_size))
+
+    def __repr__ (self):
+        return '{}({}, commands={}, rows={})'.format(
+            self.__class__.__name__, self.name, self.commands, self.rows)
+
+def callees (ir, number):
+    """Yield the subroutines that a subroutine calls or branches to."""
+    start, end = ir.subroutine(number)
+    for pc in range(start, end):
+        if ir.ops[pc] == CALL:
+            yield ir.args[pc]
+        elif ir.ops[pc] == BRANCH:
+            yield from (target for (branch, _), target in ir.targets.items()
+                        if branch == ir.args[pc])
+
+def owners (ir):
+    """
+    Return the name of the definition that owns every subroutine.
+
+    Lambda expansions and named s-expressions are their own definitions,
+    while the branches of conditionals and other anonymous sequences belong
+    to the definition that first reaches them.
+
+    """
+    res = {ir.root : ir.name(ir.root)}
+    pending = [ir.root]
+    while pending:
+        number = pending.pop(0)
+        for callee in callees(ir, number):
+            if callee in res:
+                continue
+            seq = ir.sequences[callee]
+            if isinstance(seq, LambdaSequence) or seq.name is not None:
+                res[callee] = ir.name(callee)
+            else:
+                res[callee] = res[number]
+            pending.append(callee)
+    return res
+
+def definition_stats (ir):
+    """
+    Return the DefinitionStats of every definition that a Bytecode reaches,
+    from the one drawn into the most rows.
+    """
+    owner = owners(ir)
+    res = {}
+    def stats (number):
+        name = owner[number]
+        if name not in res:
+            res[name] = DefinitionStats(name)
+        return res[name]
+    for number in owner:
+        entry = stats(number)
+        if isinstance(ir.sequences[number], LambdaSequence):
+            entry.expansions += 1
+        start, end = ir.subroutine(number)
+        ops = ir.ops
+        for pc in range(start, end):
+            op = ops[pc]
+            if op in CONTROL:
+                continue
+            entry.commands += 1
+            if op == PUSH:
+                entry.pushes += 1
+            elif op == DUPLICATE:
+                entry.access += 1
+            elif op == ROLL:
+                entry.access += 1
+                if pc - start >= 2 and ops[pc-1] == ops[pc-2] == PUSH:
+                    entry.access += 2
+    for _, _, number in attributed_commands(ir, strict=False):
+        stats(number).rows += 1
+    return sorted(res.values(), key=lambda entry: -entry.rows)
+
+def is_drawable (ir):
+    """Return whether a straight-line image can be drawn from a Bytecode."""
+    return not any(op in (BRANCH, JUMP, JUMPZ) for op in ir.ops)
+
+def collect (source, optimize=True, simulate=True):
+    """
+    Evaluate a source file and return the Bytecode of its Program.
+
+    Branches are only expanded once they are taken, so unless `simulate` is
+    false the program is run first to include the branches it takes.
+
+    """
+    from pietc import compile_source
+    from pietc.optimize import RULES
+    from pietc.sim import Simulator
+    program = compile_source(source)
+    rules = RULES if optimize else None
+    if not simulate:
+        return Bytecode(program, rules)
+    sim = Simulator(program, rules=rules)
+    sim.run()
+    return sim.ir
+
+COLUMNS = ('expansions', 'commands', 'pushes', 'access', 'rows', 'codels',
+           'pixels')
+
+def report (source, entries, codel_size=1, drawable=True):
+    """Return the DefinitionStats of a source file as a table."""
+    rows = [entry.as_dict(codel_size) for entry in entries]
+    total = dict((column, sum(row[column] for row in rows))
+                 for column in COLUMNS)
+    total['name'] = 'total'
+    width = max([len('definition')] + [len(row['name']) for row in rows])
+    lines = ['{}{}'.format(source, '' if drawable else
+                           ' (cannot be drawn as a straight line)'),
+             '{:<{}} '.format('definition', width)
+             + ' '.join('{:>10}'.format(column) for column in COLUMNS)]
+    for row in rows + [total]:
+        lines.append('{:<{}} '.format(row['name'], width)
+                     + ' '.join('{:>10}'.format(row[column])
+                                for column in COLUMNS))
+    return '\n'.join(lines)
+
+def summary (source, entries, codel_size=1, drawable=True):
+    """Return the DefinitionStats of a source file as a JSON object."""
+    return dict(source=source, codel_size=codel_size, drawable=drawable,
+                definitions=[entry.as_dict(codel_size) for entry in entries])
@@ -0,0 +1,112 @@
+from math import isqrt
+from functools import lru_cache
+from pietc.image import CODELLEN
+
+# the largest value a single color block can push within one codel.
+MAXPUSH = CODELLEN
+# every command other than push is drawn as a single pixel of a new color.
+COMMAND_COST = 1
+# values up to this are searched exhaustively (see `synthesize`).
+SEARCH_LIMIT = MAXPUSH ** 3
+
+def recipe_cost (recipe):
+    """Return the pixel area of a recipe of `(name, value)` pairs."""
+    return sum(value if name == 'push' else COMMAND_COST
+               for name, value in recipe)
+
+def _best (*recipes):
+    return min(recipes, key=recipe_cost)
+
+def _combine (first, second, name):
+    return first + second + ((name, None),)
+
+def _around (value, base, quot):
+    """
+    Yield the recipes of `value` as `quot * base + rem` and as
+    `(quot + 1) * base - rem`, where `quot` is `value // base`.
+    """
+    rem = value - quot * base
+    product = _combine(synthesize(quot), synthesize(base), 'multiply')
+    if rem == 0:
+        yield product
+        return
+    yield _combine(product, synthesize(rem), 'add')
+    product = _combine(synthesize(quot + 1), synthesize(base), 'multiply')
+    yield _combine(product, synthesize(base - rem), 'subtract')
+
+def _square (root):
+    return synthesize(root) + (('duplicate', None), ('multiply', None))
+
+@lru_cache(maxsize=None)
+def synthesize (value):
+    """
+    Return the cheapest known recipe that leaves `value` on the stack.
+
+    A recipe is a tuple of `(name, value)` pairs where only pushes carry a
+    value, and every push is at most MAXPUSH. The cost of a recipe is the
+    pixel area that it needs: a push of `n` takes `n` pixels and any other
+    command takes COMMAND_COST.
+
+    Candidates are built from strictly smaller values, so the search always
+    terminates, and results are memoized for the whole program. Values up to
+    SEARCH_LIMIT are searched exhaustively; larger ones are only split by
+    factors up to MAXPUSH and around their square root, so that a literal
+    takes time in the number of its digits rather than in its value.
+
+    Examples
+    ========
+
+    >>> from pietc.synth import synthesize
+    >>> synthesize(16)
+    (('push', 4), ('duplicate', None), ('multiply', None))
+
+    """
+    if value == 0:
+        return (('push', 1), ('not', None))
+    small = abs(value) <= SEARCH_LIMIT
+    if value < 0:
+        # subtract from zero, or from a small value that is cheap to push.
+        candidates = [_combine(synthesize(0), synthesize(-value), 'subtract')]
+        if small:
+            for start in range(1, MAXPUSH + 1):
+                candidates.append(_combine(synthesize(start),
+                                           synthesize(start - value),
+                                           'subtract'))
+        return _best(*candidates)
+    candidates = []
+    if value <= MAXPUSH:
+        candidates.append((('push', value),))
+    if value <= 2 * MAXPUSH:
+        for rest in range(1, min(value, MAXPUSH + 1)):
+            candidates.append(_combine(synthesize(value - rest),
+                                       synthesize(rest), 'add'))
+    factor = 2
+    while factor * factor <= value and (small or factor <= MAXPUSH):
+        if value % factor == 0:
+            other = value // factor
+            if other == factor:
+                candidates.append(_square(factor))
+            else:
+                candidates.append(_combine(synthesize(factor),
+                                           synthesize(other), 'multiply'))
+        factor += 1
+    if small:
+        if value > MAXPUSH:
+            # value = base * quot + rem or base * quot - rem for a small base.
+            for base in range(2, MAXPUSH + 1):
+                candidates.extend(_around(value, base, value // base))
+    else:
+        # split value around the nearest squares, and around a power of
+        # MAXPUSH close to its square root.
+        root = isqrt(value)
+        rem = value - root * root
+        candidates.append(_combine(_square(root), synthesize(rem), 'add')
+                          if rem else _square(root))
+        candidates.append(_combine(_square(root + 1),
+                                   synthesize((root + 1) ** 2 - value),
+                                   'subtract'))
+        base = MAXPUSH
+        while base * base * MAXPUSH <= value:
+            base *= MAXPUSH
+        candidates.extend(_around(value, base, value // base))
+    return _best(*candidates)
@@ -0,0 +1,202 @@
+import os
+import sys
+import json
+import time
+import threading
+import warnings
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# every category of event that the compiler can emit.
+CATEGORIES = (
+    'evaluate',     # an s-expression is evaluated
+    'execute',      # an operator is applied to its evaluated operands
+    'lambda',       # a lambda is called, or cannot be lowered into a loop
+    'sequence',     # a Sequence is called as a function
+    'conditional',  # a Conditional is called as a function
+    'stack',        # the tracked stack offset of a lambda changes
+    'simulate',     # the legacy simulator runs a command or enters a sequence
+)
+
+class RingBuffer (object):
+    """
+    Keep the latest `size` events in memory.
+
+    Events are stored as they are, so nothing is formatted unless they are
+    read.
+
+    """
+    def __init__ (self, size=4096):
+        self.buffer = deque(maxlen=size)
+
+    def write (self, event):
+        self.buffer.append(event)
+
+    def events (self, category=None):
+        return [event for event in self.buffer
+                if category is None or event['category'] == category]
+
+    def clear (self):
+        self.buffer.clear()
+
+    def __len__ (self):
+        return len(self.buffer)
+
+class JSONLSink (object):
+    """
+    Write every event as a line of JSON to a stream, or to a file if
+    `target` is a path.
+
+    Values that JSON cannot represent, such as Sequences, are written as
+    their repr.
+
+    """
+    def __init__ (self, target):
+        self.owned = isinstance(target, str)
+        self.stream = open(target, 'a') if self.owned else target
+        self.lock = threading.Lock()
+
+    def write (self, event):
+        line = json.dumps(event, default=repr)
+        with self.lock:
+            self.stream.write(line + '\n')
+
+    def close (self):
+        if self.owned:
+            self.stream.close()
+
+class Scope (object):
+    """The categories that are enabled in a context and where they go."""
+    def __init__ (self, categories, sink):
+        unknown = set(categories) - set(CATEGORIES)
+        if unknown:
+            raise ValueError('unknown trace categories: {}'
+                             .format(', '.join(sorted(unknown))))
+        self.categories = frozenset(categories)
+        self.sink = sink
+
+    def __repr__ (self):
+        return '{}({})'.format(self.__class__.__name__,
+                               sorted(self.categories))
+
+MUTED = Scope((), None)
+
+# the number of scopes that are active anywhere, so that `enabled` returns
+# right away while nothing is being traced.
+ACTIVE = 0
+_active_lock = threading.Lock()
+# the scope of contexts that have not entered one, see `install`.
+_default = MUTED
+_scope = ContextVar('pietc_trace_scope', default=None)
+
+def _activate (delta):
+    global ACTIVE
+    with _active_lock:
+        ACTIVE += delta
+
+def current ():
+    """Return the Scope of the current context."""
+    scope = _scope.get()
+    return _default if scope is None else scope
+
+def enabled (category):
+    """
+    Return whether events of `category` are recorded in this context.
+
+    Call sites check this before building the fields of an event, so tracing
+    costs a single call while it is disabled:
+
+    >>> if trace.enabled('evaluate'):
+    ...     trace.emit('evaluate', sexpr=sexpr)
+
+    """
+    return ACTIVE != 0 and category in current().categories
+
+def emit (category, **fields):
+    """Record an event in the sink of the current scope."""
+    scope = current()
+    if category not in scope.categories:
+        return
+    fields['category'] = category
+    fields['time'] = time.perf_counter()
+    scope.sink.write(fields)
+
+@contextmanager
+def tracing (*categories, sink=None):
+    """
+    Record events of `categories` (or all of them) within the block.
+
+    The scope is context-local, so it only applies to the current thread or
+    task, and nested scopes replace the outer one until they exit. Yields the
+    sink, a new RingBuffer by default.
+
+    Examples
+    ========
+
+    >>> from pietc import trace
+    >>> with trace.tracing('lambda') as events:
+    ...     evaluate(sexpr, program.env, program)
+    >>> events.events('lambda')
+    [{'lambda': ..., 'args': [...], 'category': 'lambda', 'time': ...}]
+
+    """
+    if sink is None:
+        sink = RingBuffer()
+    token = _scope.set(Scope(categories or CATEGORIES, sink))
+    _activate(1)
+    try:
+        yield sink
+    finally:
+        _activate(-1)
+        _scope.reset(token)
+
+@contextmanager
+def muted ():
+    """Record nothing within the block."""
+    token = _scope.set(MUTED)
+    try:
+        yield None
+    finally:
+        _scope.reset(token)
+
+def install (categories, sink):
+    """
+    Enable `categories` for every context that has not entered a scope of
+    its own, such as for the whole life of a process.
+    """
+    global _default
+    if _default is MUTED:
+        _activate(1)
+    _default = Scope(categories, sink)
+
+def install_from_environment (environ=os.environ):
+    """
+    Install the comma separated categories in `$PIETC_TRACE` (or `all`),
+    writing JSON lines to `$PIETC_TRACE_FILE` or to stderr.
+
+    This runs when pietc is imported, so unknown categories are ignored
+    with a warning rather than raising like `tracing` and `install` do.
+    """
+    names = environ.get('PIETC_TRACE')
+    if not names:
+        return
+    if names == 'all':
+        categories = CATEGORIES
+    else:
+        categories = []
+        for name in names.split(','):
+            name = name.strip()
+            if not name:
+                continue
+            if name in CATEGORIES:
+                categories.append(name)
+            else:
+                warnings.warn('PIETC_TRACE: ignoring unknown trace category '
+                              '{!r}'.format(name), RuntimeWarning)
+        if not categories:
+            return
+    path = environ.get('PIETC_TRACE_FILE')
+    install(categories, JSONLSink(path if path else sys.stderr))
+
+install_from_environment()
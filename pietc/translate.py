@@ -0,0 +1,199 @@
+import sys
+import hashlib
+from collections import OrderedDict
+from pietc.run import PietImage, Interpreter, roll, NOOP, PUSH, POP, ADD, \
+    SUBTRACT, MULTIPLY, DIVIDE, MODULO, NOT, GREATER, POINTER, SWITCH, \
+    DUPLICATE, ROLL, IN_INT, IN, OUT_INT, OUT
+
+# lines of python emitted for each static command.
+TEMPLATES = {
+    NOOP : [],
+    POP : ['if stack: stack.pop()'],
+    ADD : ['if len(stack) > 1: x = stack.pop(); stack[-1] += x'],
+    SUBTRACT : ['if len(stack) > 1: x = stack.pop(); stack[-1] -= x'],
+    MULTIPLY : ['if len(stack) > 1: x = stack.pop(); stack[-1] *= x'],
+    DIVIDE : ['if len(stack) > 1 and stack[-1]: x = stack.pop(); stack[-1] //= x'],
+    MODULO : ['if len(stack) > 1 and stack[-1]: x = stack.pop(); stack[-1] %= x'],
+    NOT : ['if stack: stack[-1] = int(not stack[-1])'],
+    GREATER : ['if len(stack) > 1: x = stack.pop(); stack[-1] = int(stack[-1] > x)'],
+    DUPLICATE : ['if stack: stack.append(stack[-1])'],
+    ROLL : ['if len(stack) > 1: roll(stack)'],
+    IN_INT : ['x = vm.read_int()', 'if x is not None: stack.append(x)'],
+    IN : ['x = vm.read_char()', 'if x is not None: stack.append(x)'],
+    OUT_INT : ['if stack: out.append(str(stack.pop()))'],
+    OUT : ['if stack: out.append(chr(stack.pop()))'],
+}
+
+class TranslatedImage (object):
+    """
+    A Piet image compiled ahead of time into a Python function.
+
+    Parameters
+    ==========
+
+    image : PietImage
+        The program to be translated.
+
+    Every reachable `(block, dp, cc)` state is enumerated once using the
+    transitions of the image. Runs of states that can only be entered from
+    one place are merged into basic blocks, and each basic block is emitted
+    as a straight-line Python function that returns the index of the next
+    basic block. `pointer` and `switch` end a basic block, since their
+    successor depends on the stack. The generated source is kept in
+    `source` and is `exec`d once.
+
+    The result behaves like `Interpreter`, except that `max_steps` is only
+    checked between basic blocks.
+
+    """
+    def __init__ (self, image):
+        self.image = image
+        self.states = []
+        self.state_index = {}
+        self.transitions = []
+        self._explore()
+        self.source = self._generate()
+        namespace = {'roll' : roll}
+        exec(compile(self.source, '<piet {}>'.format(id(self)), 'exec'),
+             namespace)
+        self.blocks = namespace['BLOCKS']
+        self.lengths = namespace['LENGTHS']
+
+    def _state (self, state):
+        if state not in self.state_index:
+            self.state_index[state] = len(self.states)
+            self.states.append(state)
+            self.transitions.append(None)
+        return self.state_index[state]
+
+    def _successors (self, res):
+        """Return the possible next states following a transition."""
+        block, dp, cc, op = res
+        if op == POINTER:
+            return [(block, (dp + n) % 4, cc) for n in range(4)]
+        if op == SWITCH:
+            return [(block, dp, (cc + n) % 2) for n in range(2)]
+        return [(block, dp, cc)]
+
+    def _explore (self):
+        start = self.image.start()
+        if start is None:
+            return
+        self._state(start)
+        pending = [start]
+        while pending:
+            state = pending.pop()
+            res = self.image.move(*state)
+            self.transitions[self.state_index[state]] = res
+            if res is None:
+                continue
+            for succ in self._successors(res):
+                if succ not in self.state_index:
+                    self._state(succ)
+                    pending.append(succ)
+
+    def _leaders (self):
+        """Return the states that must begin a basic block."""
+        preds = [0] * len(self.states)
+        leaders = set([0]) if self.states else set()
+        for res in self.transitions:
+            if res is None:
+                continue
+            succs = self._successors(res)
+            for succ in succs:
+                idx = self.state_index[succ]
+                preds[idx] += 1
+                if len(succs) > 1:
+                    leaders.add(idx)
+        leaders.update(idx for idx, count in enumerate(preds) if count > 1)
+        return leaders
+
+    def _generate (self):
+        leaders = self._leaders()
+        order = sorted(leaders)
+        number = dict(zip(order, range(len(order))))
+        block_size = self.image.block_size
+        lines = []
+        lengths = []
+        for idx in order:
+            lines.append('def block_{} (stack, out, vm):'.format(number[idx]))
+            length = 0
+            while True:
+                res = self.transitions[idx]
+                if res is None:
+                    lines.append('    return -1')
+                    break
+                length += 1
+                block, dp, cc = self.states[idx]
+                nblock, ndp, ncc, op = res
+                if op == PUSH:
+                    lines.append('    stack.append({})'
+                                 .format(int(block_size[block])))
+                elif op in (POINTER, SWITCH):
+                    targets = [number[self.state_index[succ]]
+                               for succ in self._successors(res)]
+                    lines.append('    if not stack: return {}'
+                                 .format(targets[0]))
+                    lines.append('    return {}[stack.pop() % {}]'
+                                 .format(tuple(targets), len(targets)))
+                    break
+                else:
+                    lines.extend('    ' + line for line in TEMPLATES[op])
+                idx = self.state_index[(nblock, ndp, ncc)]
+                if idx in leaders:
+                    lines.append('    return {}'.format(number[idx]))
+                    break
+            lengths.append(length)
+        lines.append('BLOCKS = [{}]'.format(', '.join(
+            'block_{}'.format(n) for n in range(len(order)))))
+        lines.append('LENGTHS = {}'.format(lengths))
+        return '\n'.join(lines) + '\n'
+
+    def __call__ (self, stdin='', max_steps=None):
+        """Run the translated program and return its output."""
+        vm = Interpreter(self.image, stdin, max_steps)
+        stack = vm.stack
+        out = vm.output
+        blocks = self.blocks
+        lengths = self.lengths
+        steps = 0
+        pc = 0 if blocks else -1
+        while pc >= 0:
+            if max_steps is not None and steps >= max_steps:
+                break
+            steps += lengths[pc]
+            pc = blocks[pc](stack, out, vm)
+        vm.steps = steps
+        return ''.join(out)
+
+# the most recently used translations, oldest first.
+_translated = OrderedDict()
+MAX_TRANSLATED = 32
+
+def image_digest (image):
+    """Return a hash that identifies the codels of a PietImage."""
+    digest = hashlib.sha256(repr(image.shape).encode())
+    digest.update(image.colors.tobytes())
+    return digest.hexdigest()
+
+def translate (image):
+    """
+    Return the TranslatedImage for `image`, which may be a PietImage or a
+    path to a PNG. Translations are cached by the content of the image, and
+    only the `MAX_TRANSLATED` most recently used ones are kept.
+    """
+    if not isinstance(image, PietImage):
+        image = PietImage.open(image)
+    key = image_digest(image)
+    if key in _translated:
+        _translated.move_to_end(key)
+    else:
+        _translated[key] = TranslatedImage(image)
+        while len(_translated) > MAX_TRANSLATED:
+            _translated.popitem(last=False)
+    return _translated[key]
+
+if __name__ == '__main__':
+    sys.stdout.write(translate(sys.argv[1])(sys.stdin.read()
+                                            if len(sys.argv) < 3
+                                            else sys.argv[2]))
@@ -1,4 +1,4 @@
-from distutils.core import setup
+from setuptools import setup
 
 setup(
         name='pietc',
@@ -7,5 +7,8 @@ setup(
         url='https://github.com/cjayross/hackutd2019',
         version='0.1-dev',
         packages=['pietc',],
-        install_requires=['PLY'],
+        install_requires=['PLY', 'numpy', 'Pillow'],
+        entry_points={
+            'console_scripts' : ['pietc = pietc.cli:main'],
+        },
         )
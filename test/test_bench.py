@@ -0,0 +1,19 @@
+from bench import suite
+
+def test_times_are_only_compared_when_stored ():
+    results = {'program' : dict(parse=1.0, evaluate=1.0, simulate=1.0,
+                                commands=10, area=100, steps=10)}
+    counts = {'program' : dict(commands=10, area=100, steps=10)}
+    assert suite.compare(results, counts) == []
+    times = {'program' : dict(counts['program'], simulate=0.1)}
+    assert suite.compare(results, times) == [('program', 'simulate', 0.1, 1.0)]
+
+def test_counts_are_compared ():
+    results = {'program' : dict(parse=0, evaluate=0, simulate=0,
+                                commands=20, area=100, steps=10)}
+    baseline = {'program' : dict(commands=10, area=100, steps=10)}
+    assert suite.compare(results, baseline) == [('program', 'commands', 10, 20)]
+
+def test_stored_baseline_has_no_times ():
+    for metrics in suite.load_baseline().values():
+        assert set(metrics) == set(suite.COUNTS)
@@ -0,0 +1,48 @@
+from pietc.cache import CompileCache, compile_cached, form_keys
+from pietc.parse import iter_sexpressions
+from pietc.run import Interpreter, PietImage
+
+PROGRAM = '''(define identity (lambda (x) x))
+(define f (lambda (x) (g x)))
+(define g (lambda (x) {}))
+(f (identity 1))
+'''
+
+def execute (path):
+    vm = Interpreter(PietImage.open(str(path)))
+    vm.run()
+    return vm.stack
+
+def compile_text (tmp_path, cache, text):
+    source = tmp_path / 'program.pl'
+    source.write_text(text)
+    output = tmp_path / 'program.png'
+    compile_cached(str(source), str(output), cache)
+    return execute(output)
+
+def test_editing_a_callee_recompiles (tmp_path):
+    # `f` refers to `g` before it is defined.
+    cache = CompileCache(str(tmp_path / 'cache'))
+    assert compile_text(tmp_path, cache, PROGRAM.format('(+ x 1)')) == [2]
+    assert compile_text(tmp_path, cache, PROGRAM.format('(* x 10)')) == [10]
+    assert compile_text(tmp_path, cache, PROGRAM.format('(+ x 1)')) == [2]
+    assert cache.hits > 0
+
+def test_keys_follow_rebinding ():
+    def keys (text):
+        return form_keys(list(iter_sexpressions(text.splitlines(True))))
+    before = keys(PROGRAM.format('(+ x 1)') + '(define g (lambda (x) x))\n'
+                  '(f (identity 1))\n')
+    after = keys(PROGRAM.format('(+ x 1)') + '(define g (lambda (x) 0))\n'
+                 '(f (identity 1))\n')
+    # the first call still sees the first `g`, the second one the new `g`.
+    assert before[3] == after[3]
+    assert before[5] != after[5]
+
+def test_eviction_keeps_the_limit (tmp_path):
+    cache = CompileCache(str(tmp_path), max_bytes=100)
+    for i in range(10):
+        cache.put('{:02}'.format(i) * 32, '.stream', bytes(30))
+    assert cache.usage() <= 100
+    assert sum(size for _, size, _ in cache.entries()) == cache.usage()
+    assert cache.get('09' * 32, '.stream') == bytes(30)
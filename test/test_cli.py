@@ -0,0 +1,25 @@
+import os
+import shutil
+import pytest
+from pietc.cli import compile_file, main
+
+CORPUS = os.path.join(os.path.dirname(__file__), '..', 'bench', 'corpus')
+
+@pytest.mark.parametrize('jobs', ['0', '-2', 'x'])
+def test_jobs_must_be_positive (jobs, capsys):
+    with pytest.raises(SystemExit) as exit:
+        main(['compile', '-j', jobs, CORPUS])
+    assert exit.value.code == 2
+    assert 'positive integer' in capsys.readouterr().err
+
+def test_control_flow_is_not_drawable (tmp_path, capsys):
+    for name in ('conditionals.pl', 'strings.pl'):
+        shutil.copy(os.path.join(CORPUS, name), str(tmp_path))
+    res = compile_file(str(tmp_path / 'conditionals.pl'))
+    assert res.error is None
+    assert res.not_drawable == 'cannot draw conditional'
+    assert main(['compile', '-j', '1', str(tmp_path)]) == 1
+    out = capsys.readouterr().out
+    assert 'conditionals.pl: not drawable: cannot draw conditional' in out
+    assert 'compiled 1 of 2 files (1 not drawable)' in out
+    assert (tmp_path / 'strings.png').exists()
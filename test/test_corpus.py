@@ -0,0 +1,27 @@
+import pytest
+from pietc import compile_source, sim
+from pietc.sim import Simulator
+from bench.suite import corpus
+
+# the stack that each program in bench/corpus leaves behind.
+EXPECTED = {
+    'conditionals' : [8, 3],
+    'fizzbuzz' : [73],
+    'recursion' : [80, 48, 7, 8, 3628800, 20100],
+    'strings' : [3],
+}
+
+PROGRAMS = dict(corpus())
+
+def test_every_program_is_checked ():
+    assert sorted(PROGRAMS) == sorted(EXPECTED)
+
+@pytest.mark.parametrize('name', sorted(EXPECTED))
+def test_simulator (name):
+    assert Simulator(compile_source(PROGRAMS[name])).run() == EXPECTED[name]
+
+@pytest.mark.parametrize('name', sorted(EXPECTED))
+def test_legacy_simulate (name):
+    del sim.stack[:]
+    sim.simulate(list(compile_source(PROGRAMS[name])))
+    assert sim.stack == EXPECTED[name]
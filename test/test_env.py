@@ -0,0 +1,22 @@
+from pietc.eval import Environment
+
+def test_binds_only_invalidate_the_scopes_below ():
+    root = Environment({'x' : 1})
+    left = Environment({}, Environment({}, root))
+    right = Environment({}, root)
+    assert left.lookup('x') == 1
+    cached = left.resolved['x']
+    right.bind('x', 2)
+    assert left.lookup('x') == 1 and right.lookup('x') == 2
+    # the entry is still valid, so it was not looked up again.
+    assert left.resolved['x'] is cached
+
+def test_shadowing_bind_invalidates_the_cache ():
+    root = Environment({'x' : 1})
+    middle = Environment({}, root)
+    leaf = Environment({}, middle)
+    assert leaf.lookup('x') == 1
+    middle.bind('x', 2)
+    assert leaf.lookup('x') == 2
+    root.bind('x', 3)
+    assert leaf.lookup('x') == 2
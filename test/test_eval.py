@@ -0,0 +1,84 @@
+from io import StringIO
+from pietc import compile_source
+from pietc.eval import evaluate
+from pietc.sim import Simulator
+
+PRELUDE = '(define identity (lambda (x) x))\n'
+
+def run (source):
+    return Simulator(compile_source(StringIO(PRELUDE + source))).run()
+
+def test_redefinition ():
+    # the second call must not reuse the expansion of `f` that called the
+    # first `g`.
+    assert run('(define g (lambda (x) (+ x 1)))\n'
+               '(define f (lambda (x) (g x)))\n'
+               '(f (identity 1))\n'
+               '(define g (lambda (x) (* x 10)))\n'
+               '(f (identity 1))\n') == [2, 10]
+
+def test_redefinition_of_loop ():
+    assert run('(define step (lambda (x) (+ x 1)))\n'
+               '(define count (lambda (n acc)'
+               ' (if (> n 0) (count (- n 1) (step acc)) acc)))\n'
+               '(count (identity 3) 0)\n'
+               '(define step (lambda (x) (+ x 2)))\n'
+               '(count (identity 3) 0)\n') == [3, 6]
+
+def test_argument_order_through_higher_order_lambdas ():
+    # `(- a b)` reads its parameters in an order that differs from the
+    # source, whichever way the lambda is reached.
+    mk = '(define mk (lambda (k) (lambda (a b) (- a b))))\n'
+    assert run(mk + '((mk 3) (identity 10) (identity 1))\n')[-1] == 9
+    assert run(mk + '(define h (mk 3))\n'
+               '(h (identity 10) (identity 1))\n')[-1] == 9
+    assert run('(define apply (lambda (f) (f (identity 10) (identity 1))))\n'
+               '(apply (lambda (a b) (- a b)))\n') == [9]
+
+def test_lambda_call_beside_a_conditional ():
+    # the value that a conditional leaves is only pushed by the branch, but
+    # the caller still has to pop the argument beneath it.
+    assert run('(define f0 (lambda (a) 8))\n'
+               '(define f1 (lambda (p) (+ (f0 p) (if p p p))))\n'
+               '(f1 6)\n') == [14]
+
+def test_parameter_read_in_a_branch ():
+    assert run('(define f (lambda (n) (if (> n 3) (* (+ n 1) (+ n 1)) 0)))\n'
+               '(f (identity 4))\n') == [25]
+
+def test_defines_elsewhere_keep_expansions ():
+    source = ('(define g (lambda (x) (+ x 1)))\n'
+              '(define f (lambda (x) (g x)))\n')
+    program = compile_source(StringIO(PRELUDE + source))
+    f = program.env.lookup('f')
+    evaluate(['f', ['identity', 1]], program.env, program)
+    expansions = dict(f.expansions)
+    # a define in another Program cannot change what the body of `f` sees.
+    compile_source(StringIO('(define g (lambda (x) (* x 10)))\n'))
+    evaluate(['f', ['identity', 1]], program.env, program)
+    assert f.expansions == expansions
+    assert Simulator(program).run() == [2, 2]
+
+def test_nested_calls_are_folded_once (monkeypatch):
+    from pietc import eval as eval_module
+    calls = []
+    fold_call = eval_module.fold_call
+    def counted (*args):
+        calls.append(args[0])
+        return fold_call(*args)
+    monkeypatch.setattr(eval_module, 'fold_call', counted)
+    sexpr = ['identity', 1]
+    for _ in range(100):
+        sexpr = ['+', 1, sexpr]
+    program = compile_source(StringIO(PRELUDE))
+    evaluate(sexpr, program.env, program)
+    assert len(calls) <= 2 * 101
+    assert Simulator(program).run() == [101]
+
+def test_folds_follow_rebinding ():
+    program = compile_source(StringIO('(define k 2)\n'))
+    sexpr = ['+', 'k', 1]
+    evaluate(sexpr, program.env, program)
+    evaluate(['define', 'k', 5], program.env, program)
+    evaluate(sexpr, program.env, program)
+    assert Simulator(program).run() == [3, 6]
@@ -0,0 +1,108 @@
+import random
+import pytest
+from pietc import compile_source
+from pietc.ir import Bytecode
+from pietc.optimize import RULES, optimize, peephole
+from pietc.piet import Command, Push
+from pietc.sim import Simulator, roll_stack
+from bench.suite import corpus
+from bench.generators import generate
+
+BINARY = {
+    'add' : lambda a, b: a + b,
+    'subtract' : lambda a, b: a - b,
+    'multiply' : lambda a, b: a * b,
+    'greater' : lambda a, b: int(a > b),
+}
+
+def run (cmds, stack):
+    """Run straight-line commands over a copy of `stack`."""
+    stack = list(stack)
+    for cmd in cmds:
+        if isinstance(cmd, Push):
+            stack.append(cmd.value)
+        elif cmd.name == 'pop':
+            stack.pop()
+        elif cmd.name == 'duplicate':
+            stack.append(stack[-1])
+        elif cmd.name == 'not':
+            stack.append(int(not stack.pop()))
+        elif cmd.name == 'roll':
+            count, depth = stack.pop(), stack.pop()
+            roll_stack(stack, depth, count)
+        else:
+            b, a = stack.pop(), stack.pop()
+            stack.append(BINARY[cmd.name](a, b))
+    return stack
+
+def snippet (rng):
+    """Return a few commands, biased towards what the rules match."""
+    choice = rng.randrange(6)
+    if choice == 0:
+        return [Push(rng.randrange(4)), Push(rng.randrange(-3, 4)),
+                Command('roll')]
+    if choice == 1:
+        return [Push(1), Push(-1), Command('roll'), Command('pop')]
+    if choice == 2:
+        return [Command(rng.choice(['not', 'greater'])), Command('not'),
+                Command('not')]
+    if choice == 3:
+        return [rng.choice([Push(rng.randrange(1, 9)),
+                            Command('duplicate')]), Command('pop')]
+    if choice == 4:
+        return [Push(rng.randrange(1, 9))]
+    return [Command(rng.choice(['pop', 'duplicate', 'not', 'add',
+                                'subtract', 'multiply', 'greater']))]
+
+def programs (rng, count=500):
+    for _ in range(count):
+        cmds = [cmd for _ in range(rng.randrange(1, 8))
+                for cmd in snippet(rng)]
+        stack = [rng.randrange(-5, 10) for _ in range(8)]
+        try:
+            expected = run(cmds, stack)
+        except (IndexError, RuntimeWarning):
+            continue
+        yield cmds, stack, expected
+
+@pytest.mark.parametrize('rule', RULES, ids=lambda rule: rule.__name__)
+def test_rule_keeps_the_stack (rule):
+    rng = random.Random(rule.__name__)
+    matched = 0
+    for cmds, stack, expected in programs(rng):
+        res = peephole(cmds, [rule])
+        matched += len(res) != len(cmds)
+        assert run(res, stack) == expected, cmds
+    assert matched
+
+def test_rules_keep_the_stack ():
+    rng = random.Random(0)
+    for cmds, stack, expected in programs(rng):
+        assert run(peephole(cmds), stack) == expected, cmds
+
+SOURCES = dict(corpus())
+SOURCES.update(generate())
+
+@pytest.mark.parametrize('name', sorted(SOURCES))
+def test_optimized_programs (name):
+    program = compile_source(SOURCES[name])
+    optimize(program)
+    assert Simulator(program).run() \
+        == Simulator(compile_source(SOURCES[name])).run()
+
+@pytest.mark.parametrize('name', sorted(SOURCES))
+def test_optimized_bytecode (name):
+    expected = Simulator(compile_source(SOURCES[name])).run()
+    sim = Simulator(compile_source(SOURCES[name]), rules=RULES)
+    assert sim.run() == expected
+    program = compile_source(SOURCES[name])
+    optimize(program)
+    assert len(Bytecode(compile_source(SOURCES[name]), RULES)) \
+        == len(Bytecode(program))
+
+def test_tags_follow_the_commands ():
+    cmds = [Push(1), Push(2), Command('pop'), Push(0), Push(1),
+            Command('roll'), Command('not')]
+    res, tags = peephole(cmds, RULES, 'abcdefg')
+    assert [cmd.name for cmd in res] == ['push', 'not']
+    assert tags == ['a', 'g']
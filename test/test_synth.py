@@ -0,0 +1,28 @@
+from pietc.synth import MAXPUSH, SEARCH_LIMIT, synthesize
+
+def run (recipe):
+    stack = []
+    for name, value in recipe:
+        assert name == 'push' or value is None
+        if name == 'push':
+            assert 0 < value <= MAXPUSH
+            stack.append(value)
+        elif name == 'duplicate':
+            stack.append(stack[-1])
+        elif name == 'not':
+            stack.append(int(not stack.pop()))
+        else:
+            b, a = stack.pop(), stack.pop()
+            stack.append({'add' : a + b, 'subtract' : a - b,
+                          'multiply' : a * b}[name])
+    return stack
+
+def test_small_values ():
+    for value in range(-300, 300):
+        assert run(synthesize(value)) == [value]
+
+def test_large_values ():
+    # the search for these used to take time in the value itself.
+    for value in (SEARCH_LIMIT + 1, 10**9 + 7, 2**40 + 1, -(2**40 + 1),
+                  2**63 - 1, 10**30 + 1):
+        assert run(synthesize(value)) == [value]
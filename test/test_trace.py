@@ -0,0 +1,41 @@
+import warnings
+from io import StringIO
+import pytest
+from pietc import compile_source, trace
+
+def test_lambda_bodies_are_traced ():
+    source = ('(define identity (lambda (x) x))\n'
+              '(define f (lambda (x) (+ x 1)))\n'
+              '(f (identity 1))\n')
+    with trace.tracing('stack', 'execute') as events:
+        compile_source(StringIO(source))
+    # the body of `f` is only expanded while `f` is being called.
+    assert events.events('stack')
+    assert any(getattr(event['operator'], '__name__', None) == 'add_op'
+               for event in events.events('execute'))
+
+def test_unknown_categories ():
+    with pytest.raises(ValueError):
+        with trace.tracing('lambda', 'bogus'):
+            pass
+
+def test_unknown_categories_from_environment (monkeypatch):
+    installed = []
+    monkeypatch.setattr(trace, 'install',
+                        lambda categories, sink: installed.append(categories))
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        trace.install_from_environment({'PIETC_TRACE': 'lambda, bogus'})
+    assert installed == [['lambda']]
+    assert 'bogus' in str(caught[0].message)
+
+def test_legacy_simulate_is_traced (capsys):
+    from pietc import sim
+    program = compile_source(StringIO('(define identity (lambda (x) x))\n'
+                                      '(+ (identity 2) 3)\n'))
+    del sim.stack[:]
+    with trace.tracing('simulate') as events:
+        sim.simulate(list(program))
+    assert sim.stack == [5]
+    assert events.events()[-1]['command'] == 'add'
+    assert capsys.readouterr().out == ''
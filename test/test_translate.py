@@ -0,0 +1,26 @@
+import os
+from pietc import translate as translate_module
+from pietc.cli import main
+from pietc.run import Interpreter
+from pietc.translate import translate
+
+FIZZBUZZ = os.path.join(os.path.dirname(__file__), 'fizzbuzz.png')
+
+def test_translation_matches_interpreter ():
+    expected = Interpreter(FIZZBUZZ).run()
+    assert expected.startswith('1\n2\nFizz\n')
+    assert translate(FIZZBUZZ)() == expected
+
+def test_translations_are_bounded (monkeypatch):
+    monkeypatch.setattr(translate_module, 'MAX_TRANSLATED', 1)
+    monkeypatch.setattr(translate_module, '_translated',
+                        translate_module.OrderedDict())
+    first = translate(FIZZBUZZ)
+    assert translate(FIZZBUZZ) is first
+    translate(os.path.join(os.path.dirname(__file__), 'npiet-trace.png'))
+    assert len(translate_module._translated) == 1
+    assert translate(FIZZBUZZ) is not first
+
+def test_run_command (capsys):
+    assert main(['run', FIZZBUZZ, '']) == 0
+    assert capsys.readouterr().out == Interpreter(FIZZBUZZ).run()